@@ -0,0 +1,9 @@
+# Put the fake OpenFOAM, ParaView and gnuplot tools on the PATH and set the
+# variables PyFoam reads from an OpenFOAM installation:
+#     source benchmarks/fake_toolchain/env.sh
+FAKEFOAM_DIR="$(cd "$(dirname "${BASH_SOURCE[0]:-$0}")" && pwd)"
+export PATH="$FAKEFOAM_DIR/bin:$PATH"
+export WM_PROJECT=OpenFOAM
+export WM_PROJECT_VERSION=8
+export WM_MPLIB=SYSTEMOPENMPI
+export WM_PROJECT_DIR="$FAKEFOAM_DIR"
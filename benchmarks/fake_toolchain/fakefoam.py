@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+""" Stand-ins of the OpenFOAM and ParaView executables
+
+    The tools (simpleFoam, decomposePar, reconstructPar, foamToVTK,
+    fluent3DMeshToFoam, renumberMesh, checkMesh, pvpython, gnuplot, mpirun)
+    are symbolic links to this script in the bin directory; the tool run is
+    chosen by the name it is called by. They read and write the files of
+    the real tools - structured box mesh, ASCII fields with one value per
+    cell, decomposed processor directories, legacy VTK, csv VR results and
+    images - so that the whole pipeline (scheduling, background
+    post-processing, resume, convergence monitor, warm start) runs on a
+    machine without
+    OpenFOAM and ParaView. Source env.sh to put them on the PATH.
+
+    Settings (environment variables):
+    - FAKEFOAM_CELLS: number of cells of the mesh (default 8000)
+    - FAKEFOAM_DELAY: seconds each tool takes, e.g. '1' or
+      'decomposePar=0.5,pvpython=2' (default 0)
+    - FAKEFOAM_ITER_DELAY: seconds per simpleFoam iteration (default 0.005)
+    - FAKEFOAM_FAIL: probability of each tool failing, e.g. '0.05' or
+      'reconstructPar=0.1' (default 0)
+    - FAKEFOAM_DIVERGE: probability of a simpleFoam run diverging
+    - FAKEFOAM_RATE: decay rate of the residuals per iteration (0.02)
+    - FAKEFOAM_SEED: seed of the failures, the same seed and case give the
+      same outcome (default 0)
+"""
+
+import os, re, sys, json, math, time, glob, zlib, shutil
+import numpy as np
+
+# box domain [m], cells are evenly spread in each direction
+DOMAIN = (500., 500., 200.)
+PATCHES = ['side-n', 'side-e', 'side-s', 'side-w', 'sky', 'ground',
+           'buildings']
+FIELDS = {'U': 'volVectorField', 'p': 'volScalarField',
+          'k': 'volScalarField', 'epsilon': 'volScalarField'}
+DIMENSIONS = {'U': '[0 1 -1 0 0 0 0]', 'p': '[0 2 -2 0 0 0 0]',
+              'k': '[0 2 -2 0 0 0 0]', 'epsilon': '[0 2 -3 0 0 0 0]'}
+# initial residual of each field at the first iteration
+RESIDUALS = {'Ux': 1., 'Uy': 1., 'Uz': 1., 'p': 1., 'epsilon': 0.2,
+             'k': 1.}
+HEADER = """/*--------------------------------*- C++ -*----------------------------------*\\
+  fake OpenFOAM toolchain
+\\*---------------------------------------------------------------------------*/
+FoamFile
+{{
+    version     2.0;
+    format      ascii;
+    class       {cls};
+    location    "{location}";
+    object      {name};
+}}
+// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //
+
+"""
+
+
+########################### SETTINGS & HELPERS ################################
+
+def setting(name, tool, default):
+    """ Value of a FAKEFOAM_* setting for the tool - a single number or
+        tool=value pairs """
+    value = os.environ.get(name)
+    if not value:
+        return default
+    if '=' not in value:
+        return float(value)
+    pairs = dict(item.split('=') for item in value.split(','))
+    return float(pairs.get(tool, default))
+
+
+def chance(name, tool, case, default=0.):
+    """ Reproducible random outcome for the tool and case """
+    probability = setting(name, tool, default)
+    seed = zlib.crc32(f'{os.environ.get("FAKEFOAM_SEED", 0)}:{tool}:'
+                      f'{os.path.abspath(case)}'.encode())
+    return np.random.default_rng(seed).random() < probability
+
+
+def start(tool, case):
+    """ Common start of all tools: delay and failure """
+    print(f'fake {tool} (case {case})', flush=True)
+    time.sleep(setting('FAKEFOAM_DELAY', tool, 0.))
+    if chance('FAKEFOAM_FAIL', tool, case):
+        print(f'\n--> FOAM FATAL ERROR: fake failure of {tool}\n', flush=True)
+        sys.exit(1)
+
+
+def option(args, name, default=None):
+    """ Value of the command line option (e.g. -case) """
+    return args[args.index(name) + 1] if name in args else default
+
+
+def n_per_side():
+    return max(2, round(float(os.environ.get('FAKEFOAM_CELLS', 8000))
+                        ** (1 / 3)))
+
+
+def cell_centres(cells):
+    """ Coordinates of the cells (global indices) of the box mesh """
+    n = n_per_side()
+    idx = np.array(np.unravel_index(cells, (n, n, n))).T
+    return (idx + 0.5) * np.array(DOMAIN) / n
+
+
+def time_dirs(path):
+    """ Time directories (name, value) of a case or processor directory,
+        sorted by time """
+    times = []
+    for name in os.listdir(path) if os.path.isdir(path) else []:
+        try:
+            times.append((float(name), name))
+        except ValueError:
+            pass
+    return [name for value, name in sorted(times)]
+
+
+def latest_time(path):
+    times = time_dirs(path)
+    return times[-1] if times else None
+
+
+def read_dict_entry(path, key, default=None):
+    """ Value of a top-level entry of an OpenFOAM dictionary file """
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        match = re.search(rf'^\s*{key}\s+([^;]+);', f.read(), re.MULTILINE)
+    return match.group(1).strip() if match else default
+
+
+def cells_of(path):
+    """ Number of cells of the mesh in the case/processor directory """
+    owner = os.path.join(path, 'constant', 'polyMesh', 'owner')
+    with open(owner) as f:
+        return int(re.search(r'nCells:\s*(\d+)', f.read()).group(1))
+
+
+def processor_cells(n_cells, n_procs):
+    """ Global indices of the cells of each processor """
+    return np.array_split(np.arange(n_cells), n_procs)
+
+
+################################ FIELD FILES ##################################
+
+def split_field(text):
+    """ Split field file into (text before, internalField value, text after) """
+    match = re.search(r'^[ \t]*internalField\s+', text, re.MULTILINE)
+    end = text.index(';', match.end())
+    return text[:match.start()], text[match.end():end].strip(), \
+        text[end + 1:]
+
+
+def read_values(path, n_cells):
+    """ Internal field values (cells x components), uniform values expanded """
+    with open(path) as f:
+        value = split_field(f.read())[1]
+    if value.startswith('uniform'):
+        numbers = np.array(value[7:].strip(' ()').split(), dtype=float)
+        return np.tile(numbers, (n_cells, 1))
+    body = value[value.index('(') + 1:value.rindex(')')]
+    numbers = np.array(body.replace('(', ' ').replace(')', ' ').split(),
+                       dtype=float)
+    return numbers.reshape(n_cells, -1)
+
+
+def write_field(path, template, values, location):
+    """ Write the field file with given internal values, boundary conditions
+        taken from the template field file """
+    with open(template) as f:
+        before, value, after = split_field(f.read())
+    after = after.replace('$internalField', value)
+    if values.shape[1] == 3:
+        kind = 'vector'
+        rows = '\n'.join('(%.6g %.6g %.6g)' % tuple(v) for v in values)
+    else:
+        kind = 'scalar'
+        rows = '\n'.join('%.6g' % v for v in values[:, 0])
+    name = os.path.basename(path)
+    body = before[before.index('dimensions'):] if 'dimensions' in before \
+        else f'dimensions      {DIMENSIONS.get(name, "[0 0 0 0 0 0 0]")};\n\n'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(HEADER.format(cls=FIELDS.get(name, 'volScalarField'),
+                              location=location, name=name))
+        f.write(body)
+        f.write(f'internalField   nonuniform List<{kind}>\n{len(values)}\n'
+                f'(\n{rows}\n)\n;{after}')
+
+
+def flow_direction(case):
+    """ Flow direction set by the application in 0/include/windDirection """
+    value = read_dict_entry(os.path.join(case, '0', 'include',
+                                         'windDirection'), 'flowDir')
+    if value is None:
+        return np.array([1., 0., 0.])
+    return np.array(value.strip('()').split(), dtype=float)
+
+
+def solution(case, cells, noise):
+    """ Synthetic flow field - logarithmic profile in the flow direction,
+        disturbed by 'buildings' - and turbulence fields of the cells """
+    centres = cell_centres(cells)
+    x, y, z = centres.T
+    z0 = 0.3
+    speed = 5 * np.log((z + z0) / z0) / np.log((10 + z0) / z0)
+    speed *= 1 + 0.3 * np.sin(x / 40) * np.cos(y / 40) * np.exp(-z / 50)
+    rng = np.random.default_rng(len(cells))
+    speed *= 1 + noise * rng.standard_normal(len(cells))
+    u = speed[:, None] * flow_direction(case)[None, :]
+    k = (0.05 * speed ** 2 + 1e-3)[:, None]
+    epsilon = (0.09 ** 0.75 * k[:, 0] ** 1.5 / (0.41 * (z + z0)))[:, None]
+    p = (-0.5 * speed ** 2)[:, None]
+    return {'U': u, 'p': p, 'k': k, 'epsilon': epsilon}
+
+
+################################### TOOLS #####################################
+
+def fluent3DMeshToFoam(args):
+    case = option(args, '-case', '.')
+    start('fluent3DMeshToFoam', case)
+    write_mesh(os.path.join(case, 'constant', 'polyMesh'), n_per_side() ** 3)
+
+
+def write_mesh(mesh_dir, n_cells, cells=None):
+    """ Write polyMesh files: points of the box, owner with the number of
+        cells (as in its note) and the boundary patches """
+    os.makedirs(mesh_dir, exist_ok=True)
+    n = n_per_side()
+    axes = [np.linspace(0, length, n + 1) for length in DOMAIN]
+    points = np.array(np.meshgrid(*axes, indexing='ij')).reshape(3, -1).T
+    n_faces = 3 * n * n * (n + 1)
+    files = {
+        'points': ('vectorField', '\n'.join('(%g %g %g)' % tuple(p)
+                                            for p in points), len(points)),
+        'faces': ('faceList', '', 0),
+        'neighbour': ('labelList', '', 0),
+        'owner': ('labelList', '', 0),
+    }
+    for name, (cls, rows, size) in files.items():
+        with open(os.path.join(mesh_dir, name), 'w') as f:
+            header = HEADER.format(cls=cls, location='constant/polyMesh',
+                                   name=name)
+            if name == 'owner':
+                header = header.replace(
+                    '    object', f'    note        "nPoints:{len(points)} '
+                    f'nCells:{n_cells} nFaces:{n_faces}";\n    object')
+            f.write(header + f'{size}\n(\n{rows}\n)\n')
+    patch_faces = n * n
+    with open(os.path.join(mesh_dir, 'boundary'), 'w') as f:
+        f.write(HEADER.format(cls='polyBoundaryMesh',
+                              location='constant/polyMesh', name='boundary'))
+        f.write(f'{len(PATCHES)}\n(\n')
+        for i, patch in enumerate(PATCHES):
+            f.write(f'    {patch}\n    {{\n        type            patch;\n'
+                    f'        nFaces          {patch_faces};\n'
+                    f'        startFace       {n_faces + i * patch_faces};\n'
+                    f'    }}\n')
+        f.write(')\n')
+
+
+def checkMesh(args):
+    case = option(args, '-case', '.')
+    start('checkMesh', case)
+    print(f'    cells:            {cells_of(case)}\n\nMesh OK.\n\nEnd\n')
+
+
+def renumberMesh(args):
+    case = option(args, '-case', '.')
+    start('renumberMesh', case)
+    print(f'Renumbered {cells_of(case)} cells\n\nEnd\n')
+
+
+def decomposePar(args):
+    """ Split the mesh (unless -fields) and the fields of the initial time
+        into processor directories """
+    case = option(args, '-case', '.')
+    start('decomposePar', case)
+    n_procs = int(read_dict_entry(os.path.join(case, 'system',
+                                               'decomposeParDict'),
+                                  'numberOfSubdomains', 1))
+    fields_only = '-fields' in args
+    if not fields_only:
+        for proc_dir in glob.glob(os.path.join(case, 'processor*')):
+            shutil.rmtree(proc_dir)
+    n_cells = cells_of(case)
+    for i, cells in enumerate(processor_cells(n_cells, n_procs)):
+        proc_dir = os.path.join(case, f'processor{i}')
+        if not fields_only:
+            write_mesh(os.path.join(proc_dir, 'constant', 'polyMesh'),
+                       len(cells))
+        for field in FIELDS:
+            source = os.path.join(case, '0', field)
+            if os.path.exists(source):
+                values = read_values(source, n_cells)[cells]
+                write_field(os.path.join(proc_dir, '0', field), source,
+                            values, '0')
+    print(f'Decomposed {n_cells} cells into {n_procs} processors\n\nEnd\n')
+
+
+def reconstructPar(args):
+    """ Join the fields of the latest time of the processor directories """
+    case = option(args, '-case', '.')
+    start('reconstructPar', case)
+    proc_dirs = sorted(glob.glob(os.path.join(case, 'processor*')),
+                       key=lambda d: int(d.rsplit('processor', 1)[1]))
+    t = latest_time(proc_dirs[0]) if proc_dirs else None
+    if t is None:
+        print('No times to reconstruct\n\nEnd\n')
+        return
+    for field in FIELDS:
+        parts = [os.path.join(d, t, field) for d in proc_dirs]
+        if all(os.path.exists(part) for part in parts):
+            values = np.concatenate([read_values(part, cells_of(d))
+                                     for part, d in zip(parts, proc_dirs)])
+            write_field(os.path.join(case, t, field),
+                        os.path.join(case, '0', field), values, t)
+    print(f'Reconstructed time {t}\n\nEnd\n')
+
+
+def simpleFoam(args):
+    """ Iterate from the latest (or start) time to endTime printing the log
+        of the real solver; the residuals decay (or grow if the run
+        diverges). controlDict is re-read every iteration, so that stopAt
+        writeNow/noWriteNow stop the run. """
+    case = option(args, '-case', '.')
+    start('simpleFoam', case)
+    parallel = '-parallel' in args
+    control = os.path.join(case, 'system', 'controlDict')
+    end_time = int(float(read_dict_entry(control, 'endTime', 100)))
+    write_interval = int(float(read_dict_entry(control, 'writeInterval',
+                                               end_time)))
+    dirs = sorted(glob.glob(os.path.join(case, 'processor*')),
+                  key=lambda d: int(d.rsplit('processor', 1)[1])) \
+        if parallel else [case]
+    first = 0
+    if read_dict_entry(control, 'startFrom') == 'latestTime':
+        first = int(float(latest_time(dirs[0]) or 0))
+    n_cells = [cells_of(d) for d in dirs]
+    offsets = np.cumsum([0] + n_cells)
+    # runs started from computed velocity (warm start, resume) start lower
+    warm = np.ptp(read_values(os.path.join(dirs[0], str(first or 0), 'U'),
+                              n_cells[0]), axis=0).max() > 0
+    rate = setting('FAKEFOAM_RATE', 'simpleFoam', 0.02)
+    diverge = chance('FAKEFOAM_DIVERGE', 'simpleFoam', case)
+    diverge_at = first + max(5, (end_time - first) // 5)
+    iter_delay = setting('FAKEFOAM_ITER_DELAY', 'simpleFoam', 0.005)
+    rng = np.random.default_rng(zlib.crc32(os.path.abspath(case).encode()))
+    control_mtime = os.path.getmtime(control)
+    clock = time.time()
+
+    def write(t, residual):
+        for d, offset, n in zip(dirs, offsets, n_cells):
+            fields = solution(case, np.arange(offset, offset + n),
+                              min(residual, 0.5))
+            for field, values in fields.items():
+                template = os.path.join(d, '0', field)
+                if os.path.exists(template):
+                    write_field(os.path.join(d, str(t), field), template,
+                                values, str(t))
+
+    print(f'Starting time loop ({sum(n_cells)} cells, '
+          f'{len(dirs)} processors)\n', flush=True)
+    residual = 1.
+    for t in range(first + 1, end_time + 1):
+        time.sleep(iter_delay)
+        decay = math.exp(-rate * t) * (0.1 if warm else 1.)
+        if diverge and t > diverge_at:
+            decay = math.exp(-rate * diverge_at + 0.3 * (t - diverge_at))
+        lines = [f'Time = {t}\n']
+        for field, r0 in RESIDUALS.items():
+            residual = r0 * decay * math.exp(0.1 * rng.standard_normal())
+            solver = 'GAMG' if field == 'p' else 'smoothSolver'
+            lines.append(f'{solver}:  Solving for {field}, Initial residual '
+                         f'= {residual:.6g}, Final residual = '
+                         f'{residual * 1e-3:.6g}, No Iterations 3')
+        lines.append(f'ExecutionTime = {time.time() - clock:.2f} s  '
+                     f'ClockTime = {round(time.time() - clock)} s\n')
+        print('\n'.join(lines), flush=True)
+        if diverge and residual > 1e3:
+            print('\n#0  Foam::error::printStack(Foam::Ostream&)\n'
+                  'Floating point exception (core dumped)', flush=True)
+            sys.exit(136)
+        stop_at = 'endTime'
+        if os.path.getmtime(control) != control_mtime:
+            control_mtime = os.path.getmtime(control)
+            stop_at = read_dict_entry(control, 'stopAt', 'endTime')
+        if stop_at == 'noWriteNow':
+            break
+        if t == end_time or t % write_interval == 0 or stop_at == 'writeNow':
+            write(t, residual)
+        if stop_at == 'writeNow':
+            break
+    print('End\n', flush=True)
+
+
+def foamToVTK(args):
+    """ Write the latest time as legacy VTK: the cell centres with the
+        fields of the internal mesh, and the cells next to the ground of
+        each wall patch """
+    case = option(args, '-case', '.')
+    start('foamToVTK', case)
+    t = latest_time(case)
+    n_cells = cells_of(case)
+    fields = {field: read_values(os.path.join(case, t, field), n_cells)
+              for field in FIELDS
+              if os.path.exists(os.path.join(case, t, field))}
+    name = os.path.basename(os.path.abspath(case))
+    cells = np.arange(n_cells)
+    write_vtk(os.path.join(case, 'VTK', f'{name}_{t}.vtk'),
+              cell_centres(cells), fields)
+    n = n_per_side()
+    ground = cells[:n * n * n:n]
+    for i, patch in enumerate(['ground', 'buildings']):
+        patch_cells = ground[i::2]
+        points = cell_centres(patch_cells)
+        points[:, 2] = 0
+        write_vtk(os.path.join(case, 'VTK', patch, f'{patch}_{t}.vtk'),
+                  points, {f: v[patch_cells] for f, v in fields.items()})
+
+
+def write_vtk(path, points, fields):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('# vtk DataFile Version 2.0\nfake foamToVTK\nASCII\n'
+                'DATASET POLYDATA\n')
+        f.write(f'POINTS {len(points)} float\n')
+        np.savetxt(f, points, fmt='%g')
+        f.write(f'POINT_DATA {len(points)}\nFIELD attributes {len(fields)}\n')
+        for field, values in fields.items():
+            f.write(f'{field} {values.shape[1]} {len(points)} float\n')
+            np.savetxt(f, values, fmt='%g')
+
+
+def pvpython(args):
+    """ pv_vr.py: VR csv files above the surfaces and in the receptors,
+        pv_lawson.py: image of the Lawson results """
+    script = os.path.basename(args[0]) if args else ''
+    start('pvpython', args[1] if len(args) > 1 else '.')
+    if script == 'pv_lawson.py':
+        case, results, pv_input, logfile = args[1:5]
+        write_png(os.path.splitext(results)[0] + '.png')
+        return
+    case, v_ref, output_dir, pv_input, logfile = args[1:6]
+    with open(pv_input) as f:
+        settings = json.load(f)
+    vtk = sorted(glob.glob(os.path.join(case, 'VTK', '*.vtk')))
+    if not vtk:
+        sys.exit(f'pvpython: no VTK results in {case}')
+    points, u = read_vtk(vtk[-1])
+    vr = np.linalg.norm(u, axis=1) / float(v_ref)
+    if settings.get('vr_pictures'):
+        write_png(os.path.join(output_dir,
+                               f'VR_{os.path.basename(case)}.png'))
+        if settings.get('vr_calculate'):
+            n = n_per_side()
+            for i, surface in enumerate(str(settings['vr_surfaces']).split()):
+                # cells next to the ground, shared out among the surfaces
+                cells = np.arange(0, n * n * n, n)[i::2]
+                write_vr_csv(os.path.join(case, f'_VR_{surface}.csv'),
+                             points[cells] + [0, 0, settings['h_ref']],
+                             u[cells], vr[cells])
+    if settings.get('vr_receptors'):
+        receptors = os.path.join(os.path.dirname(pv_input),
+                                 settings['receptor_coords'])
+        coords = np.loadtxt(receptors, delimiter=',', usecols=(1, 2, 3),
+                            ndmin=2)
+        nearest = np.argmin(((points[None] - coords[:, None]) ** 2).sum(2),
+                            axis=1)
+        write_vr_csv(os.path.join(case, '_VRreceptors.csv'), coords,
+                     u[nearest], vr[nearest])
+
+
+def read_vtk(path):
+    """ Points and U of a legacy VTK file written by the fake foamToVTK """
+    with open(path) as f:
+        lines = f.read().split('\n')
+    n = int(lines[4].split()[1])
+    points = np.loadtxt(lines[5:5 + n], ndmin=2)
+    start = lines.index(next(l for l in lines if l.startswith('U 3')))
+    return points, np.loadtxt(lines[start + 1:start + 1 + n], ndmin=2)
+
+
+def write_vr_csv(path, points, u, vr):
+    with open(path, 'w') as f:
+        f.write('"U:0","U:1","U:2","VR","Points:0","Points:1","Points:2"\n')
+        np.savetxt(f, np.column_stack((u, vr, points)), delimiter=',',
+                   fmt='%.6g')
+
+
+def write_png(path):
+    """ Write a 1x1 white PNG image """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    row = b'\x00\xff\xff\xff'
+    chunk = lambda kind, data: (len(data).to_bytes(4, 'big') + kind + data +
+                                zlib.crc32(kind + data).to_bytes(4, 'big'))
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n' +
+                chunk(b'IHDR', (1).to_bytes(4, 'big') * 2 +
+                      b'\x08\x02\x00\x00\x00') +
+                chunk(b'IDAT', zlib.compress(row)) + chunk(b'IEND', b''))
+
+
+def gnuplot(args):
+    """ Read the commands of PyFoam's plots from stdin, write an image for
+        each plot to the output set (hardcopies of the residuals) """
+    output = None
+    for line in sys.stdin:
+        command = line.strip()
+        match = re.match(r'set\s+output\s+["\'](.+)["\']', command)
+        if match:
+            output = match.group(1)
+        elif re.match(r'set\s+output\s*$', command):
+            output = None
+        elif output and re.match(r'(re)?plot\b', command):
+            write_png(output)
+
+
+def mpirun(args):
+    """ Run the application once (the fake solver handles all processor
+        directories itself), mpirun options skipped """
+    with_value = {'-np', '-n', '--n', '--np', '--prefix', '--machinefile',
+                  '-machinefile', '--hostfile', '-hostfile', '-x'}
+    i = 0
+    while i < len(args) and args[i].startswith('-'):
+        i += 2 if args[i] in with_value else 1
+    os.execvp(args[i], args[i:])
+
+
+TOOLS = {f.__name__: f for f in [
+    fluent3DMeshToFoam, checkMesh, renumberMesh, decomposePar,
+    reconstructPar, simpleFoam, foamToVTK, pvpython, gnuplot, mpirun]}
+
+
+if __name__ == '__main__':
+    tool = os.path.basename(sys.argv[0])
+    if tool not in TOOLS:
+        sys.exit(f'{tool}: unknown tool, available: {", ".join(TOOLS)}')
+    TOOLS[tool](sys.argv[1:])
@@ -0,0 +1,203 @@
+""" Create a synthetic project for end-to-end runs with the fake toolchain
+
+    python benchmarks/fake_toolchain/make_project.py PROJECT_DIR
+        [--angles 8] [--processors 2] [--total-processors 4] [--iter 200]
+        [--method epw|weibull] [--set ROW=VALUE ...]
+
+    The project holds the input sheet, a template case (boundary conditions
+    of the logarithmic wind profile), a Fluent msh file, an EPW file (or
+    Heathrow-style historical records for the Weibull method) and receptor
+    coordinates. Run it with the fake tools on the PATH:
+
+        source benchmarks/fake_toolchain/env.sh
+        python -m wind_microclimate.wind_microclimate PROJECT_DIR
+"""
+
+import os, sys, argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+import synthetic
+
+CASE = 'site'
+PATCHES = ['side-n', 'side-e', 'side-s', 'side-w', 'sky', 'ground',
+           'buildings']
+FOAM_HEADER = """FoamFile
+{{
+    version     2.0;
+    format      ascii;
+    class       {cls};
+    object      {name};
+}}
+
+"""
+# boundary conditions of the inlet (all sides are inlets until the
+# application sets the outlets for the wind direction)
+BC = {
+    'U': ('volVectorField', '[0 1 -1 0 0 0 0]', 'uniform (0 0 0)',
+          '#include "include/UInlet"', 'noSlip;'),
+    'p': ('volScalarField', '[0 2 -2 0 0 0 0]', 'uniform 0',
+          'type            zeroGradient;', 'zeroGradient;'),
+    'k': ('volScalarField', '[0 2 -2 0 0 0 0]', 'uniform 0.1',
+          'type            fixedValue;\n        value           '
+          '$internalField;', 'kqRWallFunction;\n        value           '
+          '$internalField;'),
+    'epsilon': ('volScalarField', '[0 2 -3 0 0 0 0]', 'uniform 0.01',
+                'type            fixedValue;\n        value           '
+                '$internalField;', 'epsilonWallFunction;\n        value'
+                '           $internalField;'),
+}
+OUTLETS = {
+    'U': 'type            inletOutlet;\ninletValue      uniform (0 0 0);\n'
+         'value           $internalField;\n',
+    'p': 'type            fixedValue;\nvalue           uniform 0;\n',
+    'k': 'type            zeroGradient;\n',
+    'epsilon': 'type            zeroGradient;\n',
+}
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def write_case(case_dir):
+    """ Template case: initial/boundary conditions and solver settings """
+    for field, (cls, dims, internal, inlet, wall) in BC.items():
+        patches = []
+        for patch in PATCHES:
+            if patch.startswith('side'):
+                bc = inlet
+            elif patch == 'sky':
+                bc = 'type            symmetry;'
+            else:
+                bc = f'type            {wall}'
+            # the application replaces the line below the opening brace of
+            # the outlet patches
+            patches.append(f'    {patch}\n    {{\n        {bc}\n    }}\n')
+        write(os.path.join(case_dir, '0', field),
+              FOAM_HEADER.format(cls=cls, name=field) +
+              f'dimensions      {dims};\n\ninternalField   {internal};\n\n'
+              'boundaryField\n{\n' + ''.join(patches) + '}\n')
+        write(os.path.join(case_dir, '0', 'include', f'{field}Outlet'),
+              OUTLETS[field])
+    profile = ('Uref            10;\nZref            10;\n'
+               'zDir            (0 0 1);\nflowDir         $flowDir;\n'
+               'z0              uniform 0.3;\nzGround         uniform 0;\n')
+    for version in (5, 6):
+        write(os.path.join(case_dir, '0', 'include', f'ABLprofile_{version}'),
+              '#include "windDirection"\n' + profile)
+    write(os.path.join(case_dir, '0', 'include', 'UInlet_log'),
+          'type            atmBoundaryLayerInletVelocity;\n'
+          '#include "ABLprofile"\n')
+    write(os.path.join(case_dir, '0', 'include', 'windDirection'),
+          'flowDir         (1 0 0);\n')
+    write(os.path.join(case_dir, 'constant', 'transportProperties'),
+          FOAM_HEADER.format(cls='dictionary', name='transportProperties') +
+          'transportModel  Newtonian;\nnu              [0 2 -1 0 0 0 0] '
+          '1.5e-05;\n')
+    write(os.path.join(case_dir, 'constant', 'momentumTransport'),
+          FOAM_HEADER.format(cls='dictionary', name='momentumTransport') +
+          'simulationType  RAS;\nRAS\n{\n    model           kEpsilon;\n'
+          '    turbulence      on;\n}\n')
+    write(os.path.join(case_dir, 'system', 'controlDict'),
+          FOAM_HEADER.format(cls='dictionary', name='controlDict') +
+          'application     simpleFoam;\nstartFrom       startTime;\n'
+          'startTime       0;\nstopAt          endTime;\nendTime         '
+          '100;\ndeltaT          1;\nwriteControl    timeStep;\n'
+          'writeInterval   1000;\nwriteFormat     ascii;\n'
+          'runTimeModifiable true;\n')
+    for name in ('fvSchemes', 'fvSolution'):
+        write(os.path.join(case_dir, 'system', name),
+              FOAM_HEADER.format(cls='dictionary', name=name))
+
+
+def write_epw(path, seed=0):
+    """ EPW file with the header lines and hourly records of a year """
+    wind_dir, wind_speed = synthetic.hourly_wind(seed=seed)
+    header = ['LOCATION,SYNTHETIC,-,GBR,IWEC,000000,51.5,-0.1,0.0,25.0',
+              'DESIGN CONDITIONS,0', 'TYPICAL/EXTREME PERIODS,0',
+              'GROUND TEMPERATURES,0', 'HOLIDAYS/DAYLIGHT SAVINGS,No,0,0,0',
+              'COMMENTS 1,fake toolchain', 'COMMENTS 2,',
+              'DATA PERIODS,1,1,Data,Sunday, 1/ 1,12/31']
+    dates = pd.date_range('1999-01-01', periods=8760, freq='h')
+    with open(path, 'w') as f:
+        f.write('\n'.join(header) + '\n')
+        for date, wd, ws in zip(dates, wind_dir, wind_speed):
+            fields = [date.year, date.month, date.day, date.hour + 1, 60,
+                      '?9?9?9?9E0?9?9?9*9*9?9?9?9?9?9?9*_*9*9*9*9*9', 10.0,
+                      5.0, 80, 101000] + [0] * 10 + [int(wd), ws] + \
+                [5, 5, 10.0, 77777, 9, 999999999, 0, 0.0, 0, 88, 0.0, 0, 0]
+            f.write(','.join(str(x) for x in fields) + '\n')
+
+
+def input_sheet(args):
+    rows = {
+        'case': CASE, 'wind_angles': args.angles, 'wind_angle_start': 0,
+        'wind_angle_end': 360 - 360 / args.angles, 'convert_mesh': True,
+        'wind_profile': 'logarithmic', 'z_ground': 0, 'rht_epw': 0.03,
+        'rht_site': 0.5, 'run_cfd': True, 'processors': args.processors,
+        'total_processors': args.total_processors, 'iter': args.iter,
+        'vr_calculate': True, 'vr_pictures': True, 'vr_receptors': True,
+        'vr_surfaces': 'ground buildings', 'receptor_coords':
+        'receptors.csv', 'lawson_calculate': True, 'lawson_pictures': True,
+        'lawson_receptors': True, 'lawson_method': args.method,
+        'prep_weibull_params': True, 'weibull_vref': 5,
+        'bld_of_interest': 'buildings', 'other_bld': 'ground',
+        'x_camera': 250, 'y_camera': 250, 'h_ref': 1.5,
+    }
+    for item in args.set:
+        name, value = item.split('=', 1)
+        rows[name] = parse_value(value)
+    return pd.DataFrame({'INPUT VALUE': pd.Series(rows, dtype=object)})
+
+
+def parse_value(value):
+    """ Value of an input sheet row given on the command line """
+    if value in ('True', 'False'):
+        return value == 'True'
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('project_dir')
+    parser.add_argument('--angles', type=int, default=8)
+    parser.add_argument('--processors', type=int, default=2)
+    parser.add_argument('--total-processors', type=int, default=4)
+    parser.add_argument('--iter', type=int, default=200)
+    parser.add_argument('--method', default='epw',
+                        choices=['epw', 'weibull'])
+    parser.add_argument('--set', nargs='*', default=[],
+                        help='other rows of the input sheet, ROW=VALUE')
+    args = parser.parse_args()
+
+    input_dir = os.path.join(args.project_dir, 'input')
+    write_case(os.path.join(input_dir, CASE))
+    write(os.path.join(input_dir, 'site.msh'),
+          '(0 "fake Fluent mesh")\n(2 3)\n(10 (0 1 [1] 1 3))\n')
+    write_epw(os.path.join(input_dir, 'synthetic.epw'))
+    if args.method == 'weibull':
+        synthetic.historical_weather(
+            os.path.join(input_dir, 'Heathrow 1997-01-01 to 2016-12-31.csv'),
+            years=5)
+    rng = np.random.default_rng(0)
+    receptors = rng.uniform([0, 0, 1.5], [500, 500, 1.5], size=(20, 3))
+    write(os.path.join(input_dir, 'receptors.csv'),
+          ''.join(f'R{i}, {x:.2f}, {y:.2f}, {z:.2f}\n'
+                  for i, (x, y, z) in enumerate(receptors)))
+    input_sheet(args).to_excel(os.path.join(input_dir, 'INPUT.xlsx'),
+                               index_label='INPUT NAME')
+    print(f'Project written to {args.project_dir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+""" Benchmarks of the post-processing hot paths on synthetic data
+
+    python benchmarks/run_benchmarks.py [--sizes small medium large]
+        [--only exceedance_epw ...] [--repeat 3] [--label LABEL]
+        [--compare LABEL]
+
+    Each benchmark is timed for increasing sizes of the inputs (points, wind
+    directions, years of weather records). Best and median times are
+    written to benchmarks/results/<label>.json - the label defaults to the
+    current git commit - so that versions of the package can be compared:
+    with --compare the times are shown relative to the results stored
+    under the other label.
+"""
+
+import os, sys, json, time, shutil, argparse, platform, tempfile, subprocess
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from wind_microclimate.weather.weather import WeatherData
+from wind_microclimate.weather.weibull import WeibullWeatherData
+from wind_microclimate.post_proc.lawson_epw import LawsonEpw
+from wind_microclimate.post_proc.lawson_weibull import LawsonWeibull
+from wind_microclimate.post_proc.vr import VR
+import synthetic
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+SIZES = {
+    'small': {'points': 10_000, 'directions': 16, 'years': 1},
+    'medium': {'points': 200_000, 'directions': 36, 'years': 5},
+    'large': {'points': 2_000_000, 'directions': 36, 'years': 20},
+}
+
+
+# Each benchmark takes the size parameters and a temporary directory and
+# returns (setup, run): setup prepares the arguments of run before each
+# repetition (not timed), run is the timed call.
+
+def exceedance_epw(size, tmp):
+    lawson = lawson_epw(size, tmp)
+    vr = synthetic.vr_cube(size['points'], size['directions'])
+    speeds, sectors = epw_sectors(size)
+    return (lambda: (), lambda: lawson.exceedance_epw(vr, speeds, sectors))
+
+
+def exceedance_weibull(size, tmp):
+    lawson = LawsonWeibull(tmp, 'case', synthetic.angles(size['directions']),
+                           None, False, os.path.join(tmp, 'VR.csv'),
+                           os.path.join(tmp, 'lawson.csv'), False)
+    vr = synthetic.vr_cube(size['points'], size['directions'])
+    tables = synthetic.weibull_tables(lawson.angles)
+    dfs = {'Comfort': list(tables.values()), 'Safety': [tables['annual']]}
+    return (lambda: (), lambda: lawson.exceedance_weibull(vr, dfs))
+
+
+def calculate_classes(size, tmp):
+    lawson = lawson_epw(size, tmp)
+    speeds, sectors = epw_sectors(size)
+    lawson.p_exceed = lawson.exceedance_epw(
+        synthetic.vr_cube(size['points'], size['directions']), speeds,
+        sectors)
+    lawson.coords = synthetic.vr_points(size['points']).to_numpy()
+    csv = os.path.join(tmp, 'lawson.csv')
+    return (lambda: (), lambda: lawson.calculate_classes(csv))
+
+
+def group_wind_data(size, tmp):
+    wind_dir, wind_speed = synthetic.hourly_wind(int(size['years'] * 8766))
+    angles = synthetic.angles(size['directions'])
+    weather = WeatherData(None)
+    return (lambda: (), lambda: weather.group_wind_data(wind_dir, angles))
+
+
+def group_seasons(size, tmp):
+    csv = synthetic.historical_weather(os.path.join(tmp, 'weather.csv'),
+                                       size['years'])
+    data = pd.read_csv(csv)
+    weather = WeatherData(None)
+    # the table is modified in place, a fresh copy for each repetition
+    return (lambda: (data.copy(),),
+            lambda df: weather.group_seasons(df, 'datetime'))
+
+
+def prepare_weibull(size, tmp):
+    csv = synthetic.historical_weather(os.path.join(tmp, 'weather.csv'),
+                                       size['years'])
+    weather = WeibullWeatherData(csv, 5, synthetic.angles(size['directions']),
+                                 tmp)
+    return (lambda: (), weather.prepare_weibull)
+
+
+def merge_vr(size, tmp):
+    vr = VR(tmp, 'case', synthetic.angles(size['directions']),
+            os.path.join(tmp, 'VR.csv'), tmp)
+    case = os.path.join(tmp, 'case_0.0')
+
+    def setup():
+        # merged csv files are removed, written again for each repetition
+        shutil.rmtree(vr.store.path, ignore_errors=True)
+        synthetic.vr_surface_csvs(case, size['points'])
+        return ()
+    return (setup, lambda: vr.merge_vr(case, '_VR_', vr.store))
+
+
+def lawson_epw(size, tmp):
+    return LawsonEpw(tmp, 'case', synthetic.angles(size['directions']), None,
+                     os.path.join(tmp, 'VR.csv'),
+                     os.path.join(tmp, 'lawson.csv'), False)
+
+
+def epw_sectors(size):
+    """ Hourly wind speeds of a year and their wind direction groups """
+    wind_dir, wind_speed = synthetic.hourly_wind()
+    sectors = WeatherData(None).group_wind_data(
+        wind_dir, synthetic.angles(size['directions']))
+    return wind_speed, sectors
+
+
+BENCHMARKS = {f.__name__: f for f in [
+    exceedance_epw, exceedance_weibull, calculate_classes, group_wind_data,
+    group_seasons, prepare_weibull, merge_vr]}
+
+
+def time_benchmark(benchmark, size, repeat):
+    """ Return times [s] of the repetitions of the benchmark """
+    times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        setup, run = benchmark(size, tmp)
+        for _ in range(repeat):
+            args = setup()
+            start = time.perf_counter()
+            run(*args)
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def git_label():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'local'
+
+
+def compare(results, other_label):
+    """ Print times relative to the results stored under other_label """
+    with open(os.path.join(RESULTS_DIR, f'{other_label}.json')) as f:
+        other = {(r['benchmark'], r['size']): r['best']
+                 for r in json.load(f)['results']}
+    print(f'\n{"benchmark":<20} {"size":<8} {other_label:>12} '
+          f'{"this":>12} {"ratio":>7}')
+    for r in results:
+        before = other.get((r['benchmark'], r['size']))
+        if before is not None:
+            print(f'{r["benchmark"]:<20} {r["size"]:<8} {before:>12.4f} '
+                  f'{r["best"]:>12.4f} {r["best"] / before:>7.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'],
+                        choices=list(SIZES))
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--label', default=None)
+    parser.add_argument('--compare', default=None)
+    args = parser.parse_args()
+    label = args.label or git_label()
+
+    results = []
+    for size_name in args.sizes:
+        size = SIZES[size_name]
+        for name in args.only:
+            times = time_benchmark(BENCHMARKS[name], size, args.repeat)
+            results.append({'benchmark': name, 'size': size_name,
+                            'params': size, 'best': min(times),
+                            'median': float(np.median(times)),
+                            'times': times})
+            print(f'{name:<20} {size_name:<8} best {min(times):.4f} s, '
+                  f'median {np.median(times):.4f} s')
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f'{label}.json')
+    with open(path, 'w') as f:
+        json.dump({'label': label, 'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'python': platform.python_version(),
+                   'numpy': np.__version__, 'pandas': pd.__version__,
+                   'machine': platform.machine(),
+                   'processors': os.cpu_count(),
+                   'results': results}, f, indent=1)
+    print(f'Results written to {path}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
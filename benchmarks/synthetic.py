@@ -0,0 +1,85 @@
+""" Generators of synthetic inputs of the post-processing benchmarks
+
+    All generators are seeded, so that runs of different versions of the
+    package time the same data.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+POINT_COLS = ['Points:0', 'Points:1', 'Points:2']
+
+
+def angles(n_directions):
+    """ Wind directions evenly spread over the full circle """
+    return np.linspace(0, 360, num=n_directions, endpoint=False)
+
+
+def vr_points(n_points, seed=0):
+    """ Return table with coordinates of points above a 500 x 500 m site """
+    rng = np.random.default_rng(seed)
+    points = rng.uniform([0, 0, 1.5], [500, 500, 60], size=(n_points, 3))
+    return pd.DataFrame(points, columns=POINT_COLS)
+
+
+def vr_cube(n_points, n_directions, seed=0):
+    """ Return VR of the points for all directions (points x directions,
+        float32, as read by the Lawson calculation) """
+    rng = np.random.default_rng(seed)
+    # VR in sheltered areas (low) to corner accelerations (above 1)
+    return rng.gamma(4, 0.15, size=(n_points, n_directions)) \
+        .astype(np.float32)
+
+
+def vr_surface_csvs(case_dir, n_points, n_surfaces=3, seed=0):
+    """ Write partial VR results above surfaces (_VR_<surface>.csv), as left
+        in the case directory by the pvpython script """
+    os.makedirs(case_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for i, points in enumerate(np.array_split(np.arange(n_points),
+                                              n_surfaces)):
+        df = vr_points(len(points), seed=seed + i)
+        u = rng.normal(0, 3, size=(len(points), 3))
+        for j in range(3):
+            df[f'U:{j}'] = u[:, j]
+        df['VR'] = np.linalg.norm(u, axis=1) / 5
+        df.to_csv(os.path.join(case_dir, f'_VR_surface{i}.csv'), index=False)
+
+
+def hourly_wind(n_hours=8760, seed=0):
+    """ Return EPW-like hourly wind directions [deg] and speeds [m/s] -
+        prevailing south-westerly, Weibull distributed speeds """
+    rng = np.random.default_rng(seed)
+    wind_dir = np.mod(rng.normal(225, 70, n_hours), 360).round()
+    wind_speed = (5 * rng.weibull(2, n_hours)).round(1)
+    return wind_dir, wind_speed
+
+
+def historical_weather(csv, years, seed=0):
+    """ Write Heathrow-style hourly weather records (datetime, windspeed
+        [mph], winddir [deg]) with some gaps and calms, return its path """
+    dates = pd.date_range('1997-01-01', periods=int(years * 8766), freq='h')
+    wind_dir, wind_speed = hourly_wind(len(dates), seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    wind_dir[rng.random(len(dates)) < 0.01] = np.nan
+    wind_speed[rng.random(len(dates)) < 0.02] = 0
+    pd.DataFrame({'datetime': dates.strftime('%Y-%m-%d %H:%M:%S'),
+                  'windspeed': wind_speed / 0.44704,
+                  'winddir': wind_dir}).to_csv(csv, index=False)
+    return csv
+
+
+def weibull_tables(directions, seasons=('spring', 'summer', 'autumn',
+                                        'winter', 'annual'), seed=0):
+    """ Return tables with Weibull parameters (Direction, p, c, k) of each
+        season, as written by WeibullWeatherData """
+    rng = np.random.default_rng(seed)
+    tables = {}
+    for season in seasons:
+        p = rng.random(len(directions))
+        tables[season] = pd.DataFrame({
+            'Direction': directions, 'p': p / p.sum(),
+            'c': rng.uniform(3, 7, len(directions)),
+            'k': rng.uniform(1.5, 2.5, len(directions))})
+    return tables
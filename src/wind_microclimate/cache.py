@@ -0,0 +1,128 @@
+""" Content-addressed cache of the pipeline artifacts
+
+    Each stage of the pipeline (converted mesh, Weibull tables, VR of each
+    wind direction, Lawson results) is recorded in a JSON manifest together
+    with a key - hash of all inputs relevant to the stage (content of the
+    input files, settings) - and the paths of its outputs. A stage is
+    skipped only if its outputs exist and were produced from the same
+    inputs; outputs of stages whose inputs changed are removed, so that
+    they are produced again.
+"""
+
+import os, json, hashlib, shutil, threading
+from pathlib import Path
+from logging import info
+
+# size of the blocks in which files are read for hashing
+BLOCK_SIZE = 1 << 20
+
+
+class ArtifactCache:
+
+    def __init__(self, manifest):
+        self.manifest = str(manifest)
+        self.lock = threading.Lock()
+        self.stages = {}
+        # digests of hashed files: path -> [size, mtime, digest]
+        self.files = {}
+        if os.path.exists(self.manifest):
+            with open(self.manifest) as f:
+                data = json.load(f)
+            self.stages = data.get('stages', {})
+            self.files = data.get('files', {})
+
+    def key(self, *parts):
+        """ Return hash of the given inputs; pathlib.Path objects stand for
+            the content of the file (or of all files in the directory),
+            other values for themselves """
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, Path):
+                h.update(self.path_digest(part).encode())
+            else:
+                h.update(json.dumps(part, sort_keys=True, default=repr)
+                         .encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def path_digest(self, path):
+        if path.is_dir():
+            h = hashlib.sha256()
+            for child in sorted(p for p in path.rglob('*') if p.is_file()):
+                h.update(str(child.relative_to(path)).encode())
+                h.update(self.file_digest(child).encode())
+            return h.hexdigest()
+        if not path.exists():
+            return 'missing'
+        return self.file_digest(path)
+
+    def file_digest(self, path):
+        """ Hash of the file content, not recomputed while the size and
+            modification time of the file are the same """
+        path = os.path.abspath(str(path))
+        stat = os.stat(path)
+        with self.lock:
+            known = self.files.get(path)
+        if known is not None and known[:2] == [stat.st_size,
+                                               stat.st_mtime_ns]:
+            return known[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                h.update(block)
+        with self.lock:
+            self.files[path] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+    def stored_key(self, stage):
+        """ Return key of the recorded stage (None if not recorded) """
+        with self.lock:
+            return self.stages.get(stage, {}).get('key')
+
+    def fresh(self, stage, key):
+        """ Check if the stage was recorded with the same key and all its
+            outputs exist """
+        with self.lock:
+            record = self.stages.get(stage)
+        return record is not None and record['key'] == key and \
+            all(os.path.exists(output) for output in record['outputs'])
+
+    def record(self, stage, key, outputs=()):
+        """ Record outputs of the stage produced from inputs with the key """
+        with self.lock:
+            self.stages[stage] = {'key': key,
+                                  'outputs': [str(o) for o in outputs]}
+            self.save()
+
+    def invalidate(self, stage, key, outputs=()):
+        """ Remove outputs of the stage if they were produced from other
+            inputs. Outputs which exist but were not recorded yet (e.g. from
+            a run without the cache) are adopted. Return True if the outputs
+            are up to date. """
+        with self.lock:
+            record = self.stages.get(stage)
+        if record is None:
+            if outputs and all(os.path.exists(o) for o in outputs):
+                self.record(stage, key, outputs)
+                return True
+            return False
+        if record['key'] == key:
+            return self.fresh(stage, key)
+        info(f'Inputs of {stage} changed, removing outdated results')
+        for output in set(record['outputs']) | set(str(o) for o in outputs):
+            if os.path.isdir(output):
+                shutil.rmtree(output)
+            elif os.path.exists(output):
+                os.remove(output)
+        with self.lock:
+            del self.stages[stage]
+            self.save()
+        return False
+
+    def save(self):
+        """ Write the manifest (called with the lock held) """
+        tmp = self.manifest + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'stages': self.stages, 'files': self.files}, f,
+                      indent=1)
+        os.replace(tmp, self.manifest)
@@ -1,7 +1,9 @@
-import json, sys
+import json, os, sys
 import pandas as pd
 from logging import info, error, exception
 
+from wind_microclimate.solver.convergence import parse_tolerances
+
 
 class UserInput:
 
@@ -21,11 +23,18 @@ class UserInput:
         self.angles = self.inputs.loc['wind_angles', 'INPUT VALUE']
         self.angle_start = self.inputs.loc['wind_angle_start', 'INPUT VALUE']
         self.angle_end = self.inputs.loc['wind_angle_end', 'INPUT VALUE']
+        # stages profiled into output/profiles (e.g. 'VR.merge_vr, 
+        # LawsonWeibull.wind_microclimate' or 'all'), overridden by the 
+        # WIND_MICROCLIMATE_PROFILE environment variable
+        self.profile = self.optional_input('profile', None)
 
     def pre_proc_input(self):
         self.convert_msh = self.inputs.loc['convert_mesh', 'INPUT VALUE']
         self.wind_profile = self.inputs.loc['wind_profile', 'INPUT VALUE']
         self.z_ground = self.inputs.loc['z_ground', 'INPUT VALUE']
+        # mesh of the wind direction cases linked to the template mesh
+        # instead of copied
+        self.share_mesh = self.optional_input('share_mesh', False)
         if self.wind_profile == 'csv':
             self.csv_profile = self.inputs.loc['csv_profile', 'INPUT VALUE'] 
         elif self.wind_profile == 'logarithmic':
@@ -40,6 +49,29 @@ class UserInput:
         self.run_cfd = self.inputs.loc['run_cfd', 'INPUT VALUE']
         self.proc = self.inputs.loc['processors', 'INPUT VALUE']
         self.it = self.inputs.loc['iter', 'INPUT VALUE']
+        # mesh decomposed once on the template case, not for each case
+        self.decompose_once = self.optional_input('decompose_once', False)
+        # cases initialised from the calculated case with the closest wind
+        # direction, calculated for warm_start_iter iterations
+        self.warm_start = self.optional_input('warm_start', False)
+        self.warm_start_iter = self.optional_input('warm_start_iter', self.it)
+        # calculation stopped once the residuals drop below the tolerances 
+        # (e.g. 'p: 1e-4, U: 1e-5') or if they grow divergence_factor times
+        # above their minimum
+        try:
+            self.residual_tolerances = parse_tolerances(
+                self.optional_input('residual_tolerances', ''))
+        except ValueError:
+            error('residual_tolerances not valid, expected e.g. ' +
+                  "'p: 1e-4, U: 1e-5'")
+            sys.exit()
+        self.divergence_factor = self.optional_input('divergence_factor', None)
+        # processors shared by cases calculated at the same time
+        self.total_proc = self.optional_input('total_processors', self.proc)
+        # background jobs run on processors not used by the CFD calculations
+        self.postproc_workers = int(self.optional_input('postproc_workers',
+            max(1, (os.cpu_count() or 1) - self.total_proc)))
+        self.postproc_timeout = self.optional_input('postproc_timeout', None)
 
     def post_proc_input(self):
         self.vr_calculate = self.inputs.loc['vr_calculate', 'INPUT VALUE']
@@ -51,6 +83,14 @@ class UserInput:
 
         if self.vr_calculate or self.vr_pictures:
             self.vr_surfaces = self.inputs.loc['vr_surfaces', 'INPUT VALUE']
+        # VR above surfaces calculated by ParaView or numpy (no ParaView)
+        self.vr_engine = self.optional_input('vr_engine', 'paraview')
+        if self.vr_engine != 'paraview' and self.vr_engine != 'numpy':
+            error(f'{self.vr_engine} VR engine is not valid, available ' +
+                  'options are:\nparaview\nnumpy')
+            sys.exit()
+        # VR results exported to csv files next to the binary store
+        self.vr_csv = self.optional_input('vr_csv', False)
         if self.vr_receptors:
             self.receptors_csv = self.inputs.loc['receptor_coords', 'INPUT VALUE']
         if self.lawson_calculate or self.lawson_receptors or self.lawson_pictures or \
@@ -60,6 +100,12 @@ class UserInput:
                 error(f'{self.method} method is not valid for wind ' +
                       'microclimate calculation')
                 sys.exit()
+            # number of points processed at once by the Lawson calculation,
+            # all points if not given
+            self.lawson_chunk_size = self.optional_input('lawson_chunk_size',
+                                                         None)
+            if self.lawson_chunk_size is not None:
+                self.lawson_chunk_size = int(self.lawson_chunk_size)
             if self.method == 'weibull':
                 self.prep_weibull_params = self.inputs.loc['prep_weibull_params', 'INPUT VALUE']
                 self.weibull_vref = self.inputs.loc['weibull_vref', 'INPUT VALUE']
@@ -71,10 +117,22 @@ class UserInput:
             self.y_camera = self.inputs.loc['y_camera', 'INPUT VALUE']
             self.h_ref = self.inputs.loc['h_ref', 'INPUT VALUE']
 
+    def optional_input(self, name, default):
+        """ Return value of an optional input, or the default if the row is 
+            missing or empty """
+        if name not in self.inputs.index or \
+                pd.isna(self.inputs.loc[name, 'INPUT VALUE']):
+            return default
+        return self.inputs.loc[name, 'INPUT VALUE']
+
     def write_pv_input(self, path):
         paraview_rows = ['vr_calculate', 'vr_pictures', 'vr_receptors', 
             'vr_surfaces', 'receptor_coords', 'bld_of_interest', 'other_bld',
             'x_camera', 'y_camera', 'h_ref']
         self.inputs_paraview = self.inputs.loc[paraview_rows].to_dict()['INPUT VALUE']
+        if self.vr_engine == 'numpy':
+            # VR above surfaces and in receptors is not exported by ParaView
+            self.inputs_paraview['vr_calculate'] = False
+            self.inputs_paraview['vr_receptors'] = False
         with open(path, 'w') as pv_input:
             pv_input.write(json.dumps(self.inputs_paraview, indent=0))
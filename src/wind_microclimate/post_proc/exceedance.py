@@ -0,0 +1,85 @@
+""" Vectorized kernels for the exceedance of wind speed thresholds
+
+    All kernels take the velocity ratios as a 2D array (points x wind
+    directions) and process the points in blocks of chunk_size rows, so that
+    the size of the temporary arrays does not depend on the size of the mesh.
+    The array may be memory-mapped (e.g. float32 VR cube on disk), only the
+    current block is loaded and converted to float64.
+"""
+
+import numpy as np
+
+# number of points processed at once by the exceedance kernels
+CHUNK_SIZE = 10000
+
+
+def weibull_exceedance(vr, p, c, k, thresholds, chunk_size=CHUNK_SIZE):
+    """ Probability of exceeding wind speed thresholds given Weibull
+        distribution parameters of all wind directions.
+
+        vr: velocity ratios, shape (points, directions)
+        p, c, k: probability, scale and shape parameters of each wind
+            direction, shape (tables, directions) - one row per weather table
+            (e.g. season)
+        thresholds: wind speed thresholds, shape (thresholds,)
+
+        Returns array of shape (tables, points, thresholds). """
+    p, c, k = (np.atleast_2d(np.asarray(a, dtype=float)) for a in (p, c, k))
+    thresholds = np.asarray(thresholds, dtype=float)
+    exceedance = np.empty((p.shape[0], vr.shape[0], thresholds.size))
+    # (1, tables, directions, thresholds) views broadcast over the points
+    thr = thresholds[None, None, None, :]
+    c_4d, k_4d = c[None, :, :, None], k[None, :, :, None]
+    for start in range(0, vr.shape[0], chunk_size):
+        stop = start + chunk_size
+        # local wind speed for each point, table and direction
+        v = np.asarray(vr[start:stop], dtype=float)[:, None, :, None] * c_4d
+        # zero velocity (e.g. points inside buildings) never exceeds
+        with np.errstate(divide='ignore'):
+            weibull = np.exp(-(thr / v) ** k_4d)
+        exceedance[:, start:stop] = np.einsum('td,ntdh->tnh', p, weibull)
+    return exceedance
+
+
+def epw_exceedance(vr, speeds, sectors, thresholds, n_hours=None,
+                   chunk_size=CHUNK_SIZE):
+    """ Frequency of exceeding wind speed thresholds during the hourly
+        records of a weather file.
+
+        vr: velocity ratios, shape (points, directions)
+        speeds: hourly reference wind speeds, shape (hours,)
+        sectors: index of the wind direction (column of vr) of each hourly
+            record, negative for records not assigned to any direction
+        thresholds: wind speed thresholds, shape (thresholds,)
+        n_hours: number of records the frequency refers to, defaults to the
+            number of hourly records
+
+        The records of each direction are sorted once and the number of
+        hours with vr * speed > threshold is found by binary search for
+        threshold / vr. Returns array of shape (points, thresholds). """
+    speeds = np.asarray(speeds, dtype=float)
+    sectors = np.asarray(sectors)
+    thresholds = np.asarray(thresholds, dtype=float)
+    if n_hours is None:
+        n_hours = speeds.size
+    # calm/missing records never exceed the thresholds
+    valid = ~np.isnan(speeds) & (sectors >= 0)
+    speeds, sectors = speeds[valid], sectors[valid]
+    # sort by direction, then by wind speed within each direction
+    order = np.lexsort((speeds, sectors))
+    speeds, sectors = speeds[order], sectors[order]
+    bounds = np.searchsorted(sectors, np.arange(vr.shape[1] + 1))
+    exceedance = np.zeros((vr.shape[0], thresholds.size))
+    for start in range(0, vr.shape[0], chunk_size):
+        stop = start + chunk_size
+        vr_block = np.asarray(vr[start:stop], dtype=float)
+        for d in range(vr.shape[1]):
+            speeds_d = speeds[bounds[d]:bounds[d + 1]]
+            if speeds_d.size == 0:
+                continue
+            # zero velocity ratio gives infinite speed, never exceeded
+            with np.errstate(divide='ignore', invalid='ignore'):
+                limit = thresholds[None, :] / vr_block[:, d, None]
+            exceedance[start:stop] += speeds_d.size - \
+                np.searchsorted(speeds_d, limit, side='right')
+    return exceedance / n_hours
@@ -1,10 +1,114 @@
 import glob
-import multiprocessing
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait
+from logging import info, error, exception
+
+from wind_microclimate import telemetry
+from wind_microclimate.post_proc.vr_store import VRStore, store_path
+
+
+class Job:
+    """Chain of dependent steps (e.g. reconstruct -> VTK -> VR -> merge)
+    of one case. Steps are commands (lists of arguments) or Python
+    callables, each of them runs only if the previous one succeeded."""
+
+    def __init__(self, name, steps, log_dir, timeout=None):
+        self.name = name
+        self.steps = steps
+        self.log_dir = log_dir
+        self.timeout = timeout
+        # exit code of each step run so far, None if timed out
+        self.exit_codes = {}
+
+    @property
+    def succeeded(self):
+        return len(self.exit_codes) == len(self.steps) and all(
+            code == 0 for code in self.exit_codes.values()
+        )
+
+    def run(self):
+        for step in self.steps:
+            if callable(step):
+                step_name = getattr(step, '__name__', 'step')
+                exit_code = self.run_callable(step)
+            else:
+                step_name = os.path.basename(step[0])
+                exit_code = self.run_command(step)
+            self.exit_codes[step_name] = exit_code
+            if exit_code != 0:
+                error(
+                    f'{self.name}: {step_name} failed ' +
+                    ('(timed out)' if exit_code is None
+                     else f'(exit code {exit_code})') +
+                    ', remaining steps skipped'
+                )
+                break
+        return self.succeeded
+
+    def run_command(self, cmd):
+        log = os.path.join(self.log_dir, '{0}.log'.format(
+            os.path.basename(cmd[0])))
+        with open(log, 'w') as f:
+            try:
+                return telemetry.run(
+                    cmd, direction=self.name, timeout=self.timeout,
+                    stdout=f, stderr=subprocess.STDOUT
+                )
+            except subprocess.TimeoutExpired:
+                return None
+            except OSError:
+                exception(f'{self.name}: could not run {cmd[0]}')
+                return -1
+
+    def run_callable(self, func):
+        try:
+            with telemetry.stage(getattr(func, '__name__', 'step'), self.name):
+                func()
+            return 0
+        except Exception:
+            exception(f'{self.name}: {getattr(func, "__name__", func)} failed')
+            return 1
+
+
+class PostProcPool:
+    """Bounded pool of workers running post-processing jobs in the
+    background, so that the calculation of next wind direction starts
+    straight away. The number of workers limits the number of
+    post-processing processes running next to the CFD calculations."""
+
+    def __init__(self, workers=1, timeout=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = []
+
+    def submit(self, name, steps, log_dir):
+        """Queue a chain of steps, return the Job object"""
+        job = Job(name, steps, log_dir, timeout=self.timeout)
+        self.jobs.append((job, self.executor.submit(job.run)))
+        return job
+
+    def barrier(self):
+        """Wait until all submitted jobs finish; return True if all of them
+        succeeded"""
+        if not self.jobs:
+            return True
+        info(f'Waiting until {len(self.jobs)} post-processing jobs finish')
+        wait([future for job, future in self.jobs])
+        failed = [job.name for job, future in self.jobs if not job.succeeded]
+        if failed:
+            error('Post-processing failed for: ' + ', '.join(failed))
+        self.jobs = []
+        return not failed
+
+    def shutdown(self):
+        self.barrier()
+        self.executor.shutdown()
 
 
 def postproc_background(
+    pool,
     case,
     it,
     path_vr,
@@ -13,29 +117,38 @@ def postproc_background(
     logfile,
     vr_pictures=False,
     vr_receptors=False,
+    merge=None,
+    calculate_vr=None,
 ):
-    """Reconstruct, convert to VTK and run VR calculation if not done already.
-    This can be done in the background, so that the calculation of next
+    """Reconstruct, convert to VTK, run VR calculation (calculate_vr callable
+    for VR above surfaces and in receptors without ParaView, pvpython script) and merge VR
+    results (merge callable) if not done already. The steps are queued in
+    the pool and run in the background, so that the calculation of next
     wind direction start straight away"""
-    clean_cwd()
+    case_path = case.case_path
+    clean_cwd(prefix=os.path.split(case_path)[1])
     # cleaning the directory from unnecessary files
     case.foam_obj.clearOther(pyfoam=True, removeAnalyzed=True)
-    case_path = case.case_path
-    csv_vr = str(path_vr).replace('.csv', f'_{os.path.split(case_path)[1]}.csv')
-    csv_vr_receptors = csv_vr.replace('VR_', 'VR_receptors_')
-    commands = []
+    # merged VR results of the case (surfaces, receptors)
+    vr_done = VRStore(store_path(path_vr)).exists(case_path)
+    vr_receptors_done = VRStore(store_path(path_vr, receptors=True)).exists(
+        case_path
+    )
+    steps = []
     if not os.path.exists(os.path.join(case_path, str(it))):
-        commands.append(['reconstructPar', '-case', case_path, '-latestTime'])
+        steps.append(['reconstructPar', '-case', case_path, '-latestTime'])
     if not (
         os.path.exists(
             os.path.join(case_path, 'VTK', '{0}_{1}.vtk'.format(case_path, it))
         )
     ):
-        commands.append(['foamToVTK', '-case', case_path, '-latestTime'])
-    if (vr_pictures and not os.path.exists(csv_vr)) or (
-        vr_receptors and not os.path.exists(csv_vr_receptors)
-    ):
-        commands.append(
+        steps.append(['foamToVTK', '-case', case_path, '-latestTime'])
+    if calculate_vr is not None:
+        # VR above surfaces and in receptors calculated without ParaView
+        steps.append(calculate_vr)
+        vr_receptors = False
+    if (vr_pictures and not vr_done) or (vr_receptors and not vr_receptors_done):
+        steps.append(
             [
                 'pvpython',
                 vr_script,
@@ -46,27 +159,16 @@ def postproc_background(
                 logfile,
             ]
         )
-    p = multiprocessing.Process(
-        target=init_sbp,
-        args=(
-            commands,
-            case_path,
-        ),
-    )
-    p.start()
-    return p
-
-
-def init_sbp(commands, case_path):
-    for cmd in commands:
-        with open(os.path.join(case_path, '{0}.log'.format(cmd[0])), 'w') as f:
-            subprocess.run(cmd, stdout=f, stderr=subprocess.STDOUT)
+        if merge is not None:
+            steps.append(merge)
+    return pool.submit(os.path.split(case_path)[1], steps, case_path)
 
 
-def clean_cwd():
+def clean_cwd(prefix=''):
     """Cluean current working directory from unwanted images of residuals
-    after running simulations"""
-    types = ['*bound*.png', '*linear*.png']
+    after running simulations (only images of the case with given prefix,
+    other cases may still be running)"""
+    types = [f'{prefix}*bound*.png', f'{prefix}*linear*.png']
     files_grabbed = []
     for files in types:
         files_grabbed.extend(glob.glob(files))
@@ -1,21 +1,33 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-import string, os, subprocess, glob
+import string, os, glob
 import numpy as np
 import pandas as pd
 from logging import info
 
+from wind_microclimate import telemetry
+from wind_microclimate.post_proc.vr_store import VRStore, store_path, \
+    cache_stage
+
 
 class Lawson(ABC):
 
     def __init__(self, case_dir, case, angles, csv_vr, csv_lawson,
-                 receptors):
+                 receptors, chunk_size=None, cache=None):
         self.case = os.path.join(case_dir, case)
         self.angles = angles
         self.csv_vr = str(csv_vr)
-        self.csv_vr_receptors = f'{self.csv_vr.rstrip(".csv")}_receptors.csv'
+        # binary stores of VR results (surfaces, receptors)
+        self.store = VRStore(store_path(self.csv_vr))
+        self.store_receptors = VRStore(store_path(self.csv_vr, receptors=True))
         self.csv_lawson = str(csv_lawson)
         self.p_exceed = np.zeros((2, 2)) # hack
+        self.point_cols = ['Points:0', 'Points:1', 'Points:2']
+        # number of points processed at once (all points if not given)
+        self.chunk_size = chunk_size
+        # artifact cache, results are not calculated again if VR results and 
+        # weather data did not change
+        self.cache = cache
 
     def calculate(self, receptors=False):
         """ Read VR data and initiate calculation of wind microclimate results 
@@ -23,52 +35,93 @@ class Lawson(ABC):
             is calculated using one of the following methods: 
             - 'epw': exceedance during Typical Meteorological Year in epw file
             - 'weibull': using Weibull distribution parameters for a given location"""
-        if receptors:
-            csv_vr = self.csv_vr_receptors
-        else:
-            csv_vr = self.csv_vr
-        # TO DO: check if dataframe is optimal for speed in this case
-        self.dfs_vr = [pd.read_csv(csv_vr.replace
-                       ('.csv', f'_{os.path.split(self.case)[1]}_{angle}.csv'),
-                       header=0) for angle in self.angles]
+        weather_inputs = self.weather_inputs()
+        if self.cache is not None:
+            stage = 'Lawson_receptors' if receptors else 'Lawson'
+            key = self.cache.key(
+                stage, type(self).__name__, self.thresh_ws, self.thresh_freq,
+                [self.cache.stored_key(cache_stage(f'{self.case}_{angle}',
+                                                   receptors))
+                 for angle in self.angles],
+                *[Path(path) for path in sorted(weather_inputs)])
+            if self.cache.fresh(stage, key):
+                info(f'{stage} results up to date')
+                return
+        self.outputs = []
+        store = self.store_receptors if receptors else self.store
+        # velocity ratios as a memory-mapped (points x wind directions) array,
+        # the exceedance kernels read it in blocks of points
+        self.vr = store.cube([f'{self.case}_{angle}' for angle in self.angles])
+        # point coordinates and names are the same for all wind directions
+        self.coords = store.read_points(mmap_mode='r')
+        self.names = store.read_names()
         self.wind_microclimate(receptors=receptors)
-
-    def calculate_classes(self, csv_lawson, receptors=False):
-        """ Calculate exceedance of all threshold wind speeds using given method 
-            (epw or weibull), assign relevant wind comfort class to each point 
-            and write the results to a file """
-        classes = np.zeros(len(self.dfs_vr[0]), dtype=float)
-        for freq, idx in zip(self.p_exceed, range(classes.shape[0])):
-            classes[idx] += self.assign_class(freq)
-        classes[classes > len(self.thresh_ws_values) - 1] = \
-            len(self.thresh_ws_values) - 1
-        self.points_class = np.vstack((classes, 
-                                    self.dfs_vr[0]['Points:0'].to_numpy(), 
-                                    self.dfs_vr[0]['Points:1'].to_numpy(), 
-                                    self.dfs_vr[0]['Points:2'].to_numpy())).T
+        if self.cache is not None:
+            self.cache.record(stage, key, self.outputs)
+
+    def weather_inputs(self):
+        """ Return paths of the weather data files the results depend on """
+        return []
+
+    def write_results(self, csv_outputs, exceedance, receptors=False):
+        """ Stream blocks of points (chunk_size) through the exceedance 
+            function and the class assignment, appending the results of each 
+            block to the output files. The exceedance function takes VR of 
+            a block (points x wind directions) and returns exceedance array 
+            (outputs x points x thresholds), one output per csv file. """
+        n_points = self.vr.shape[0]
+        chunk_size = self.chunk_size or max(n_points, 1)
+        for start in range(0, max(n_points, 1), chunk_size):
+            block = slice(start, start + chunk_size)
+            p_exceed = exceedance(self.vr[block])
+            for csv_lawson, p_exceed_output in zip(csv_outputs, p_exceed):
+                self.p_exceed = p_exceed_output
+                output = self.calculate_classes(csv_lawson,
+                                                receptors=receptors,
+                                                block=block)
+                if output not in self.outputs:
+                    self.outputs.append(output)
+
+    def calculate_classes(self, csv_lawson, receptors=False, block=None):
+        """ Assign relevant wind comfort class to each point based on the 
+            exceedance of all threshold wind speeds calculated using given 
+            method (epw or weibull) and write the results to a file; results 
+            of a block of points other than the first one are appended; 
+            return path of the file """
+        if block is None:
+            block = slice(0, None)
+        append = bool(block.start)
+        self.classes = self.assign_classes(self.p_exceed)
         Path(os.path.dirname(csv_lawson)).mkdir(parents=True, exist_ok=True)
         if not receptors:
-            fields = 'Class,Points:0,Points:1,Points:2'
-            np.savetxt(csv_lawson, self.points_class, delimiter=',', 
-                fmt=['%d', '%f', '%f', '%f'], header=fields, comments='')
+            # coordinates are shared by all result files, no copy needed
+            df_lawson = pd.DataFrame(self.coords[block],
+                                     columns=self.point_cols, copy=False)
+            df_lawson.insert(0, 'Class', self.classes)
+            df_lawson.to_csv(csv_lawson, index=False, float_format='%f',
+                             mode='a' if append else 'w', header=not append)
+            return csv_lawson
         else:
-            self.receptors_table(csv_lawson)
-
-    def assign_class(self, freq):
-        """ Assign wind comfort class based on exceedance frequency of given 
-            threshold wind speeds """
-        assigned_class = len(self.thresh_freq_values)
-        while freq[(assigned_class - 1)] \
-            < self.thresh_freq_values[(assigned_class - 1)] \
-            and assigned_class > 0:
-            assigned_class -= 1
-        return assigned_class
-
-    def receptors_table(self, csv_lawson):
+            return self.receptors_table(csv_lawson, block=block, append=append)
+
+    def assign_classes(self, p_exceed):
+        """ Assign wind comfort class to each point based on exceedance 
+            frequency (points x thresholds) of given threshold wind speeds - 
+            the class follows the highest threshold exceeded more often than 
+            allowed, capped at the 'Uncomfortable' class """
+        exceeded = ~(np.asarray(p_exceed) < self.thresh_freq_values)
+        n_thresholds = exceeded.shape[1]
+        last_exceeded = n_thresholds - np.argmax(exceeded[:, ::-1], axis=1)
+        classes = np.where(exceeded.any(axis=1), last_exceeded, 0)
+        return np.minimum(classes, len(self.thresh_ws_values) - 1) \
+            .astype(np.int8)
+
+    def receptors_table(self, csv_lawson, block=slice(0, None),
+                        append=False):
         """ Generate csv file with wind comfort results for receptor locations """
         info('Generating tabular wind comfort results for receptor locations...')
-        names = [[name] for name in self.dfs_vr[0]['Name']]
-        classes = np.delete(self.points_class, [1, 2, 3], 1)
+        names = [[name] for name in self.names[block]]
+        classes = self.classes[:, None]
         receptor_freq = np.concatenate((np.asarray(names), self.p_exceed*100), 
             axis=1)
         fields, fields_fmt = ['Name'], ['%s']
@@ -86,8 +139,10 @@ class Lawson(ABC):
         classes = np.vectorize(class_dict.get)(classes)
         receptor_table = np.concatenate((receptor_freq, classes), axis=1)
         csv_lawson_receptors = f'{csv_lawson.rstrip(".csv")}_receptors.csv'
-        np.savetxt(csv_lawson_receptors, receptor_table, delimiter=',', 
-            fmt=fields_fmt, header=','.join(fields), comments='')
+        with open(csv_lawson_receptors, 'a' if append else 'w') as f:
+            np.savetxt(f, receptor_table, delimiter=',', fmt=fields_fmt,
+                       header='' if append else ','.join(fields), comments='')
+        return csv_lawson_receptors
 
     def colour_map(self, pv_input, logfile='pv_lawson.log'):
         lawson_script = str(os.path.join(os.path.split(__file__)[0], 'scripts',
@@ -95,8 +150,10 @@ class Lawson(ABC):
         lawson_results_list = glob.glob(f'{self.csv_lawson.rstrip(".csv")}*.csv')
         for lawson_results in lawson_results_list:
             if 'receptors' not in lawson_results:
-                subprocess.run(['pvpython', lawson_script, self.case, lawson_results,
-                                pv_input, logfile])
+                telemetry.run(['pvpython', lawson_script, self.case,
+                               lawson_results, pv_input, logfile],
+                              name='render',
+                              direction=os.path.basename(lawson_results))
 
     @abstractmethod
     def wind_microclimate(self):
@@ -125,8 +182,10 @@ class Lawson(ABC):
 
 class LawsonLDDC(Lawson):
 
-    def __init__(self, case_dir, case, angles, csv_vr, csv_lawson, receptors):
-        super().__init__(case_dir, case, angles, csv_vr, csv_lawson, receptors)
+    def __init__(self, case_dir, case, angles, csv_vr, csv_lawson, receptors,
+                 chunk_size=None, cache=None):
+        super().__init__(case_dir, case, angles, csv_vr, csv_lawson, receptors,
+                         chunk_size, cache)
 
     @property
     def thresh_ws(self):
@@ -1,49 +1,66 @@
-import math, os
+import os
 import pandas as pd
 import numpy as np
 
 from wind_microclimate.post_proc.lawson import LawsonLDDC
+from wind_microclimate.post_proc.exceedance import weibull_exceedance
 
 
 class LawsonWeibull(LawsonLDDC):
 
     def __init__(self, case_dir, case, angles, weather, prep_weibull, csv_vr,
-                 csv_lawson, receptors):
-        super().__init__(case_dir, case, angles, csv_vr, csv_lawson, receptors)
+                 csv_lawson, receptors, chunk_size=None, cache=None):
+        super().__init__(case_dir, case, angles, csv_vr, csv_lawson, receptors,
+                         chunk_size, cache)
         self.weather = weather
         self.prep_weibull = prep_weibull
 
     def wind_microclimate(self, safety=True, receptors=False):
         """ Read VR results and weather data, then run wind comfort calculation. """
-        if self.prep_weibull:
-            self.weather.prepare_weibull()
-        csv_input = self.weather.find_weibull(weibull_dir=self.weather.output_dir)
+        csv_input = self.csv_input
         self.dfs_weibull = [pd.read_csv(csv, header=0) for csv in csv_input]
+        dfs = {'Comfort': self.dfs_weibull}
         if safety:
-            df_saf = [df for idx, df in enumerate(self.dfs_weibull) 
-                      if 'annual' in csv_input[idx]][0]
-        for df_weibull, csv_in in zip(self.dfs_weibull, csv_input):
-            # TO DO: check if this is efficient
-            vr_gens = [(vr for vr in df_vr['VR'].tolist()) for df_vr in self.dfs_vr]
-            csv_lawson_season = f'{self.csv_lawson.rstrip(".csv")}_{os.path.split(csv_in)[1]}'
-            self.p_exceed = np.zeros((len(self.dfs_vr[0]),
-                len(sum(self.thresh_ws.values(), []))), dtype=float)
-            dfs = {'Comfort': df_weibull}
-            if df_saf is not None:
-                dfs['Safety'] = df_saf
-            for idx, vrs in enumerate(zip(*vr_gens)):
-                self.p_exceed[idx] += self.exceedance_weibull(vrs, dfs)
-            self.calculate_classes(csv_lawson_season, receptors=receptors)
-
-    def exceedance_weibull(self, vrs, dfs_weibull):
-        """ Calculate exceedance of given wind speed thresholds using Weibull 
-            distribution parameters """
-        weibull_f = lambda x, p, v, k: p * math.exp(-pow(x/v, k))
-        thresh_exceed = {'Comfort': [], 'Safety': []}
-        for key, df in dfs_weibull.items():
-            df['v'] = df['c'] * vrs
-            for threshold in sorted(self.thresh_ws[key]):
-                df['weibull'] = df.apply(lambda row: weibull_f(threshold, row['p'], 
-                    row['v'], row['k']), axis=1)
-                thresh_exceed[key].append(df['weibull'].sum())
-        return sum(thresh_exceed.values(), [])
\ No newline at end of file
+            dfs['Safety'] = [df for idx, df in enumerate(self.dfs_weibull)
+                             if 'annual' in csv_input[idx]]
+        csv_outputs = [f'{self.csv_lawson.rstrip(".csv")}_{os.path.split(csv_in)[1]}'
+                       for csv_in in csv_input]
+        # exceedance for all weather tables at once: (tables, points, thresholds)
+        self.write_results(csv_outputs,
+                           lambda vr: self.exceedance_weibull(vr, dfs),
+                           receptors=receptors)
+
+    def weather_inputs(self):
+        """ Fit Weibull parameters if requested, return the csv files with 
+            the parameters """
+        if self.prep_weibull:
+            self.weather.prepare_weibull()
+        self.csv_input = self.weather.find_weibull(
+            weibull_dir=self.weather.output_dir)
+        return self.csv_input
+
+    def exceedance_weibull(self, vr, dfs_weibull):
+        """ Calculate exceedance of given wind speed thresholds using Weibull
+            distribution parameters; vr is a (points x wind directions) array
+            and dfs_weibull maps 'Comfort'/'Safety' to lists of tables with
+            Weibull parameters. Return array (tables x points x thresholds),
+            Safety tables are shared by all Comfort tables. """
+        thresh_exceed = []
+        for key, dfs in dfs_weibull.items():
+            params = [self.weibull_table(df) for df in dfs]
+            p, c, k = (np.vstack(param) for param in zip(*params))
+            thresh_exceed.append(weibull_exceedance(vr, p, c, k,
+                                 sorted(self.thresh_ws[key])))
+        n_tables = thresh_exceed[0].shape[0]
+        return np.concatenate([np.broadcast_to(e, (n_tables,) + e.shape[1:])
+                               for e in thresh_exceed], axis=2)
+
+    def weibull_table(self, df_weibull):
+        """ Return Weibull parameters (p, c, k) ordered as self.angles;
+            directions missing from the table get zero probability """
+        df = df_weibull.set_index('Direction').sort_index()
+        df = df.reindex(self.angles, method='nearest', tolerance=1e-6)
+        # directions without fitted parameters do not contribute
+        df.loc[df['c'].isna() | df['k'].isna(), 'p'] = 0
+        df = df.fillna({'p': 0, 'c': 1, 'k': 1})
+        return tuple(df[col].to_numpy(dtype=float) for col in ('p', 'c', 'k'))
@@ -80,17 +80,18 @@ class Text(object):
         del self.pv_obj
 
 
-class Probe():
-    """ Class for the Probe objects in ParaView """
-
-    def __init__(self, source, coords, name):
-        self.pv_obj = ProbeLocation(Input=source, 
-            ProbeType='Fixed Radius Point Source')
-        self.name = name
-        self.coords = coords
-
-    def create_sheet(self, sheet_view):
-        self.sheet = Show(self.pv_obj, sheet_view)
+class Receptors(object):
+    """ Class for sampling results in all receptor locations at once in 
+        ParaView (one point cloud instead of a probe per receptor) """
+
+    def __init__(self, source, receptors):
+        self.names = [r[0] for r in receptors]
+        coords = []
+        for r in receptors:
+            coords.extend([float(r[1]), float(r[2]), float(r[3])])
+        self.points = PolyPointSource(Points=coords)
+        self.resample = ResampleWithDataset(Input=source, 
+            Source=self.points)
 
 
 class Colorbar(object):
@@ -1,7 +1,7 @@
 import os, sys, fnmatch
 import logging
 from paraview.simple import *
-from pv_helpers import GroundPatch, Probe, VrColorbar 
+from pv_helpers import GroundPatch, Receptors, VrColorbar
 from pv_helpers import read_pv_settings, read_receptors, create_vr
 
 
@@ -103,20 +103,8 @@ if vr_receptors:
     if not vr_pictures:
         calculator1 = create_vr(vtk_path, v_ref)
 
-    probe_list = []
-    # creates list with Probe objects in ParaView
-    for i in range(len(receptors)):
-        coords = [float(receptors[i][1]), float(receptors[i][2]), 
-            float(receptors[i][3])]
-        name = receptors[i][0]
-        probe_list.append(Probe(calculator1, coords, name))
-
-    spreadSheetView1 = CreateView('SpreadSheetView')
-    spreadSheetView1.ColumnToSort = ''
-    spreadSheetView1.BlockSize = 1024
-
-    # exports VR data in all receptor (probe) locations to CSV files
-    for p in probe_list:
-        p.pv_obj.ProbeType.Center = p.coords
-        p.create_sheet(spreadSheetView1)
-        ExportView('%s/_VRreceptor_%s.csv' % (case, p.name), view=spreadSheetView1)
+    # samples VR in all receptor locations at once and exports it to a single
+    # CSV file (in the order of the receptors file)
+    points = Receptors(calculator1, receptors)
+    SaveData('%s/_VRreceptors.csv' % (case), proxy=points.resample, 
+        Precision=6)
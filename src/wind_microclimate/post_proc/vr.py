@@ -1,60 +1,236 @@
-import os, subprocess, glob
+import os, glob
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from scipy.spatial import cKDTree
+from logging import info
 
+from wind_microclimate import telemetry
 from wind_microclimate.post_proc.helpers import vr_script
+from wind_microclimate.post_proc.vtk import LegacyVTK, latest_vtk
+from wind_microclimate.post_proc.vr_store import VRStore, store_path, \
+    cache_stage
 
 class VR:
 
-    def __init__(self, case_dir, case, angles, csv_vr, output_dir):
+    def __init__(self, case_dir, case, angles, csv_vr, output_dir,
+                 engine='paraview', surfaces=None, h_ref=None,
+                 receptors_csv=None, export_csv=False, cache=None,
+                 cache_inputs=()):
         self.case = str(os.path.join(case_dir, case))
         self.angles = angles
         self.csv_vr = str(csv_vr)
         self.output_dir = str(output_dir)
+        # 'paraview' (pvpython script) or 'numpy' for VR above surfaces
+        self.engine = engine
+        self.surfaces = surfaces.split() if surfaces else []
+        self.h_ref = h_ref
+        # csv file with receptor names and coordinates (no header)
+        self.receptors_csv = receptors_csv
+        # binary stores of VR results of all directions (surfaces/receptors),
+        # csv files are written only if export_csv is set
+        self.store = VRStore(store_path(self.csv_vr))
+        self.store_receptors = VRStore(store_path(self.csv_vr, receptors=True))
+        self.export_csv = export_csv
+        # artifact cache and inputs of the CFD calculation (case template, 
+        # wind profile, ...) which VR results depend on
+        self.cache = cache
+        self.cache_inputs = list(cache_inputs)
 
     def generate_results(self, vr_calculate, vr_receptors, vref, pv_input,
                          logfile='pv_vr.log'):
         Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        self.invalidate_stale(vr_calculate, vr_receptors)
         for angle in self.angles:
             case_name = f'{self.case}_{angle}'
-            csv_vr_angle = self.csv_vr.replace('.csv',
-                f'_{os.path.split(case_name)[1]}.csv')
-
-            # if not merged VR results already exist
-            if glob.glob(os.path.join(self.case, '*_VR_*.csv')):
-                if vr_calculate:
-                    # merge CSV files with VR data for surfaces
-                    self.merge_vr(case_name, csv_vr_angle)
-                if vr_receptors:
-                    # merge CSV files with VR data for receptors
-                    self.merge_vr(case_name, csv_vr_angle.replace('VR_',
-                                  'VR_receptors_'))
+            csv_vr_angle = self.csv_vr_case(case_name)
+
+            # merge VR results left in the case folder, if any
+            self.merge_case(case_name, vr_calculate, vr_receptors)
+
+            if self.engine == 'numpy':
+                self.calculate_missing(case_name, vref, vr_calculate,
+                                       vr_receptors)
 
             # if merged VR results don't exist
-            if (not vr_receptors and not os.path.exists(csv_vr_angle)) \
-            or (vr_receptors and not os.path.exists(csv_vr_angle \
-                    .replace('VR_', 'VR_receptors_'))):
-                subprocess.run(['pvpython', vr_script, case_name, str(vref),
-                                self.output_dir, pv_input, logfile])
-                if vr_calculate:
-                    # merge CSV files with VR data for surfaces
-                    self.merge_vr(case_name, '_VR_', csv_vr_angle)
-                if vr_receptors:
-                    # merge CSV files with VR data for receptors
-                    self.merge_vr(case_name, '_VRreceptor_',
-                                  csv_vr_angle.replace('VR_','VR_receptors_'))
-
-    def merge_vr(self, case, lookup_name, path_merged):
-        """ Merge csv files with VR results above individual surfaces into one
-            csv file """
-        csv_list = glob.glob(os.path.join(case, f'{lookup_name}*.csv'))
+            if (not vr_receptors and not self.store.exists(case_name)) \
+            or (vr_receptors and not self.store_receptors.exists(case_name)):
+                telemetry.run(['pvpython', vr_script, case_name, str(vref),
+                               self.output_dir, pv_input, logfile],
+                              direction=os.path.split(case_name)[1])
+                self.merge_case(case_name, vr_calculate, vr_receptors)
+
+            if self.export_csv:
+                if vr_calculate and self.store.exists(case_name):
+                    self.store.to_csv(case_name, csv_vr_angle)
+                if vr_receptors and self.store_receptors.exists(case_name):
+                    self.store_receptors.to_csv(case_name, csv_vr_angle
+                        .replace('VR_', 'VR_receptors_'))
+
+        # VR of all directions in one (points x directions) array for the
+        # Lawson calculation
+        case_names = [f'{self.case}_{angle}' for angle in self.angles]
+        for store, requested in ((self.store, vr_calculate),
+                                 (self.store_receptors, vr_receptors)):
+            if requested and all(store.exists(c) for c in case_names):
+                store.cube(case_names)
+
+    def csv_vr_case(self, case_name):
+        """ Return path of the merged VR results of the given case """
+        return self.csv_vr.replace('.csv', f'_{os.path.split(case_name)[1]}.csv')
+
+    def merge_case(self, case_name, vr_calculate, vr_receptors):
+        """ Merge partial VR results (for surfaces and receptors) written by 
+            the pvpython script to the case folder """
+        if vr_calculate and glob.glob(os.path.join(case_name, '_VR_*.csv')):
+            # merge CSV files with VR data for surfaces
+            self.merge_vr(case_name, '_VR_', self.store)
+            self.record(case_name)
+        csv_receptors = os.path.join(case_name, '_VRreceptors.csv')
+        if vr_receptors and os.path.exists(csv_receptors):
+            # name the VR data sampled in all receptors at once
+            df = pd.read_csv(csv_receptors)
+            df['Name'] = self.read_receptors()['Name'].to_numpy()
+            self.store_receptors.write(case_name, df)
+            self.record(case_name, receptors=True)
+            os.remove(csv_receptors)
+
+    def calculate_missing(self, case_name, vref, vr_calculate, vr_receptors):
+        """ Calculate VR results of the case without ParaView unless they 
+            exist already """
+        surfaces = vr_calculate and not self.store.exists(case_name)
+        receptors = vr_receptors and \
+            not self.store_receptors.exists(case_name)
+        if surfaces or receptors:
+            self.calculate_vr(case_name, vref, vr_calculate=surfaces,
+                              vr_receptors=receptors)
+
+    def calculate_vr(self, case_name, vref, vr_calculate=True,
+                     vr_receptors=False):
+        """ Calculate VR above ground surfaces (translated by h_ref) and/or in 
+            receptor locations from the foamToVTK results of the case without 
+            ParaView, write merged VR results of the case """
+        info(f'{os.path.split(case_name)[1]} - calculating VR...')
+        vtk_dir = os.path.join(case_name, 'VTK')
+        internal = LegacyVTK(latest_vtk(vtk_dir))
+        tree = cKDTree(internal.points)
+        velocity = internal.point_data['U']
+        if vr_calculate:
+            dfs = []
+            for surface in self.surfaces:
+                patch = LegacyVTK(latest_vtk(os.path.join(vtk_dir, surface)))
+                points = patch.points + np.array([0, 0, self.h_ref])
+                df = self.vr_table(tree, velocity, points, vref)
+                df['Name'] = surface
+                dfs.append(df)
+            self.store.write(case_name, pd.concat(dfs))
+            self.record(case_name)
+        if vr_receptors:
+            # all receptors sampled in one pass, one table per direction
+            receptors = self.read_receptors()
+            points = receptors[['Points:0', 'Points:1', 'Points:2']].to_numpy()
+            df = self.vr_table(tree, velocity, points, vref)
+            df['Name'] = receptors['Name'].to_numpy()
+            self.store_receptors.write(case_name, df)
+            self.record(case_name, receptors=True)
+
+    def cache_key(self, case_name, receptors=False):
+        """ Return hash of the inputs VR results of the case (of the whole 
+            store if case_name is None) depend on """
+        if receptors:
+            settings = [Path(self.receptors_csv)]
+        else:
+            settings = [self.surfaces, self.h_ref]
+        return self.cache.key(cache_stage(case_name, receptors), self.engine,
+                              *settings, *self.cache_inputs)
+
+    def invalidate_stale(self, vr_calculate, vr_receptors):
+        """ Remove VR results of the directions whose inputs changed since 
+            they were calculated """
+        if self.cache is None:
+            return
+        # points of the whole store change with the mesh, it is cleared when
+        # any of the inputs changed
+        for store, receptors in ((self.store, False),
+                                 (self.store_receptors, True)):
+            if (vr_receptors if receptors else vr_calculate):
+                stage = cache_stage(receptors=receptors)
+                key = self.cache_key(None, receptors)
+                if self.cache.stored_key(stage) not in (None, key):
+                    info(f'Inputs of {stage} changed, clearing {store.path}')
+                    store.clear()
+                self.cache.record(stage, key, [store.path])
+        for angle in self.angles:
+            case_name = f'{self.case}_{angle}'
+            for store, receptors in ((self.store, False),
+                                     (self.store_receptors, True)):
+                if (vr_receptors if receptors else vr_calculate):
+                    self.cache.invalidate(
+                        cache_stage(case_name, receptors),
+                        self.cache_key(case_name, receptors),
+                        [store.direction_npz(case_name)])
+
+    def record(self, case_name, receptors=False):
+        """ Record VR results of the case in the artifact cache """
+        if self.cache is None:
+            return
+        store = self.store_receptors if receptors else self.store
+        self.cache.record(cache_stage(case_name, receptors),
+                          self.cache_key(case_name, receptors),
+                          [store.direction_npz(case_name)])
+
+    def vr_table(self, tree, velocity, points, vref):
+        """ Return table with velocity and VR sampled in given points """
+        u = probe(tree, velocity, points)
+        df = pd.DataFrame(u, columns=['U:0', 'U:1', 'U:2'])
+        df['VR'] = np.linalg.norm(u, axis=1) / float(vref)
+        for i in range(3):
+            df[f'Points:{i}'] = points[:, i]
+        return df
+
+    def read_receptors(self):
+        """ Read receptor names and coordinates """
+        return pd.read_csv(self.receptors_csv, header=None,
+                           names=['Name', 'Points:0', 'Points:1', 'Points:2'],
+                           skipinitialspace=True)
+
+    def merge_vr(self, case, lookup_name, store):
+        """ Merge csv files with VR results above individual surfaces and 
+            write them to the store """
+        # sorted, so that the points are in the same order for all directions
+        csv_list = sorted(glob.glob(os.path.join(case, f'{lookup_name}*.csv')))
         dfs = [pd.read_csv(csv) for csv in csv_list]
         names = [os.path.split(csv)[1].strip(f'{lookup_name}.csv') 
                  for csv in csv_list]
         for df, name in zip(dfs, names):
             df['Name'] = name
         df_concat = pd.concat(dfs)
-        df_concat.to_csv(path_merged, index=False)
+        store.write(case, df_concat)
         # clean partial VR results in case folder
         for csv in csv_list:
             os.remove(csv)
+
+
+def probe(tree, values, points, k=8):
+    """ Interpolate point values of the mesh (indexed by the KD-tree) to 
+        given points - linear least squares fit to k nearest mesh points, 
+        weighted by inverse squared distance (exact for linear fields) """
+    values = np.asarray(values, dtype=float)
+    values_2d = values.reshape(len(values), -1)
+    k = min(k, tree.n)
+    dist, idx = tree.query(points, k=k)
+    dist, idx = dist.reshape(len(points), k), idx.reshape(len(points), k)
+    # points coincident with mesh points take their values
+    exact = dist[:, 0] == 0
+    result = np.empty((len(points), values_2d.shape[1]))
+    result[exact] = values_2d[idx[exact, 0]]
+    todo = ~exact
+    if todo.any():
+        weights = (1 / dist[todo])[:, :, None]
+        # local linear model: value = a + b . (x - x_point)
+        design = np.concatenate((np.ones((todo.sum(), k, 1)),
+            tree.data[idx[todo]] - points[todo][:, None, :]), axis=2)
+        coeffs = np.linalg.pinv(design * weights) @ \
+            (values_2d[idx[todo]] * weights)
+        result[todo] = coeffs[:, 0, :]
+    return result.reshape((len(points),) + values.shape[1:])
@@ -0,0 +1,179 @@
+""" Binary columnar store of VR results
+
+    VR results of every wind direction are kept in a directory next to the
+    csv results (e.g. output/VR/VR_store for output/VR/VR.csv):
+    - points.npy: coordinates of the points (float64), shared by all
+      wind directions
+    - names.npy: surface/receptor name of each point
+    - <case>_<angle>.npz: one float32 array per column of the results
+      (U:0, U:1, U:2, VR, ...) of the wind direction
+    - cube.npy: VR of all points and wind directions (points x directions,
+      float32) read by the Lawson calculation as a memory-mapped array,
+      cube_cases.npy holds the wind direction case of each column
+    Columns are loaded only when requested, so that e.g. the cube is built
+    from just the VR values of each direction.
+"""
+
+import os, shutil, threading
+import numpy as np
+import pandas as pd
+
+POINT_COLS = ['Points:0', 'Points:1', 'Points:2']
+
+_points_lock = threading.Lock()
+
+
+def store_path(csv_vr, receptors=False):
+    """ Return directory of the store for given path of the csv VR results
+        (VR above surfaces or in receptors) """
+    stem = os.path.splitext(str(csv_vr))[0]
+    return stem + ('_receptors' if receptors else '') + '_store'
+
+
+def cache_stage(case_name=None, receptors=False):
+    """ Return name of the artifact cache stage of VR results of the wind 
+        direction case, of the whole store if case_name is not given """
+    kind = 'VR_receptors' if receptors else 'VR'
+    if case_name is None:
+        return f'{kind}/store'
+    return f'{kind}/{os.path.split(case_name)[1]}'
+
+
+def save_npy(path, array):
+    """ Save array through a temporary file, so that readers never see
+        a partly written file """
+    tmp = path + '.tmp.npy'
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+class VRStore:
+    """ VR results of all wind directions of a project """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.points_npy = os.path.join(self.path, 'points.npy')
+        self.names_npy = os.path.join(self.path, 'names.npy')
+        self.cube_npy = os.path.join(self.path, 'cube.npy')
+        self.cube_cases_npy = os.path.join(self.path, 'cube_cases.npy')
+
+    def direction_npz(self, case_name):
+        return os.path.join(self.path,
+                            f'{os.path.split(case_name)[1]}.npz')
+
+    def exists(self, case_name):
+        """ Check if results of the wind direction case are stored """
+        return os.path.exists(self.direction_npz(case_name))
+
+    def write(self, case_name, df):
+        """ Store results of the wind direction case (table with Points:*
+            and Name columns, other columns are stored as float32). Points
+            are written once and have to be the same for all directions. """
+        os.makedirs(self.path, exist_ok=True)
+        points = df[POINT_COLS].to_numpy(dtype=float)
+        # directions are written by concurrent post-processing jobs, the
+        # first one writes the points (names first, points mark both done)
+        with _points_lock:
+            if os.path.exists(self.points_npy):
+                stored = np.load(self.points_npy, mmap_mode='r')
+                if stored.shape != points.shape or not np.allclose(
+                        stored, points, rtol=0, atol=1e-6):
+                    raise ValueError(f'{case_name}: VR points differ from '
+                                     f'the points in {self.path}')
+            else:
+                names = df['Name'].to_numpy(dtype=str) if 'Name' in df \
+                    else np.full(len(df), '')
+                save_npy(self.names_npy, names)
+                save_npy(self.points_npy, points)
+        columns = [col for col in df.columns
+                   if col not in POINT_COLS and col != 'Name']
+        # written to a temporary file first, so that an interrupted write
+        # does not leave results which look complete
+        tmp = self.direction_npz(case_name) + '.tmp.npz'
+        np.savez(tmp, **{col: df[col].to_numpy(dtype=np.float32)
+                         for col in columns})
+        os.replace(tmp, self.direction_npz(case_name))
+
+    def clear(self):
+        """ Remove results of all wind directions and the points """
+        with _points_lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def columns(self, case_name):
+        """ Return names of the columns stored for the wind direction """
+        with np.load(self.direction_npz(case_name)) as npz:
+            return list(npz.files)
+
+    def read_points(self, mmap_mode=None):
+        return np.load(self.points_npy, mmap_mode=mmap_mode)
+
+    def read_names(self):
+        return np.load(self.names_npy)
+
+    def read_column(self, case_name, column):
+        """ Return values of a single column of the wind direction """
+        with np.load(self.direction_npz(case_name)) as npz:
+            return npz[column]
+
+    def read(self, case_name, columns=None):
+        """ Return table with given columns of the wind direction (all
+            columns if not given); Points:* and Name columns come from the
+            arrays shared by all directions """
+        if columns is None:
+            columns = self.columns(case_name) + POINT_COLS + ['Name']
+        data = {}
+        with np.load(self.direction_npz(case_name)) as npz:
+            points = None
+            for col in columns:
+                if col in POINT_COLS:
+                    if points is None:
+                        points = self.read_points(mmap_mode='r')
+                    data[col] = np.array(points[:, POINT_COLS.index(col)])
+                elif col == 'Name':
+                    data[col] = self.read_names()
+                else:
+                    data[col] = npz[col]
+        return pd.DataFrame(data, columns=columns)
+
+    def build_cube(self, case_names):
+        """ Write VR of the given wind direction cases into the cube, one 
+            direction (column) at a time """
+        n_points = len(self.read_points(mmap_mode='r'))
+        tmp = self.cube_npy + '.tmp.npy'
+        cube = np.lib.format.open_memmap(
+            tmp, mode='w+', dtype=np.float32,
+            shape=(n_points, len(case_names)))
+        for i, case_name in enumerate(case_names):
+            cube[:, i] = self.read_column(case_name, 'VR')
+        cube.flush()
+        del cube
+        os.replace(tmp, self.cube_npy)
+        save_npy(self.cube_cases_npy, self.cube_cases(case_names))
+
+    def cube(self, case_names):
+        """ Return memory-mapped VR cube (points x directions) of the given
+            wind direction cases, (re)built if missing or out of date """
+        if not self.cube_valid(case_names):
+            self.build_cube(case_names)
+        return np.load(self.cube_npy, mmap_mode='r')
+
+    def cube_valid(self, case_names):
+        """ Check if the cube holds the given cases and is newer than their
+            results """
+        if not os.path.exists(self.cube_npy) or \
+                not os.path.exists(self.cube_cases_npy):
+            return False
+        if np.load(self.cube_cases_npy).tolist() != \
+                self.cube_cases(case_names).tolist():
+            return False
+        cube_time = os.path.getmtime(self.cube_npy)
+        return all(os.path.getmtime(self.direction_npz(case_name)) <= cube_time
+                   for case_name in case_names)
+
+    def cube_cases(self, case_names):
+        return np.array([os.path.split(case_name)[1]
+                         for case_name in case_names], dtype=str)
+
+    def to_csv(self, case_name, path):
+        """ Export all results of the wind direction to a csv file """
+        self.read(case_name).to_csv(path, index=False)
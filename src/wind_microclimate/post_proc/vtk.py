@@ -0,0 +1,138 @@
+""" Reader of the legacy VTK files written by foamToVTK
+
+    Only point coordinates and the point/cell data arrays are kept, so that
+    the results can be post-processed with numpy alone (without ParaView).
+    Both ASCII and BINARY (big-endian) legacy files are supported.
+"""
+
+import os, re
+import numpy as np
+
+# legacy VTK data types
+VTK_TYPES = {
+    'bit': 'u1', 'char': 'i1', 'unsigned_char': 'u1', 'short': 'i2',
+    'unsigned_short': 'u2', 'int': 'i4', 'unsigned_int': 'u4',
+    'long': 'i8', 'unsigned_long': 'u8', 'vtkidtype': 'i4',
+    'vtktypeint64': 'i8', 'float': 'f4', 'double': 'f8',
+}
+# bytes of ASCII data parsed at once
+ASCII_CHUNK = 1 << 20
+
+
+class LegacyVTK:
+    """ Points and point/cell data arrays of a legacy VTK file """
+
+    def __init__(self, path):
+        self.path = path
+        self.points = np.zeros((0, 3))
+        self.point_data = {}
+        self.cell_data = {}
+        with open(path, 'rb') as f:
+            self.buf = f.read()
+        self.pos = 0
+        self.read()
+        del self.buf
+
+    def read(self):
+        self.readline()
+        self.title = self.readline()
+        self.binary = self.readline().upper() == 'BINARY'
+        data = None
+        while True:
+            line = self.readline()
+            if line is None:
+                break
+            words = line.split()
+            keyword = words[0].upper()
+            if keyword == 'DATASET':
+                self.dataset = words[1].upper()
+            elif keyword == 'POINTS':
+                n = int(words[1])
+                self.points = self.read_array(n * 3, words[2]).reshape(n, 3)
+            elif keyword in ('CELLS', 'POLYGONS', 'VERTICES', 'LINES',
+                             'TRIANGLE_STRIPS'):
+                self.read_array(int(words[2]), 'int')
+            elif keyword == 'CELL_TYPES':
+                self.read_array(int(words[1]), 'int')
+            elif keyword == 'CELL_DATA':
+                data, n_tuples = self.cell_data, int(words[1])
+            elif keyword == 'POINT_DATA':
+                data, n_tuples = self.point_data, int(words[1])
+            elif keyword == 'FIELD':
+                for _ in range(int(words[2])):
+                    name, n_comp, n, dtype = self.readline().split()
+                    data[name] = self.read_components(int(n), int(n_comp),
+                                                      dtype)
+            elif keyword in ('SCALARS', 'VECTORS', 'NORMALS'):
+                n_comp = 3 if keyword != 'SCALARS' else \
+                    int(words[3]) if len(words) > 3 else 1
+                if keyword == 'SCALARS':
+                    # LOOKUP_TABLE line
+                    self.readline()
+                data[words[1]] = self.read_components(n_tuples, n_comp,
+                                                      words[2])
+            elif keyword == 'METADATA':
+                # information keys, terminated by an empty line
+                while self.buf[self.pos:self.pos + 1] not in (b'\n', b''):
+                    self.pos = self.buf.find(b'\n', self.pos) + 1
+            else:
+                raise ValueError(f'{self.path}: unsupported VTK section '
+                                 f'{keyword}')
+
+    def readline(self):
+        """ Return next non-empty text line (None at the end of file) """
+        while self.pos < len(self.buf):
+            end = self.buf.find(b'\n', self.pos)
+            if end == -1:
+                end = len(self.buf)
+            line = self.buf[self.pos:end].decode('ascii', 'replace').strip()
+            self.pos = end + 1
+            if line:
+                return line
+        return None
+
+    def read_components(self, n_tuples, n_comp, dtype):
+        values = self.read_array(n_tuples * n_comp, dtype)
+        return values.reshape(n_tuples, n_comp) if n_comp > 1 else values
+
+    def read_array(self, count, dtype):
+        """ Read count values of the given VTK data type """
+        dtype = VTK_TYPES[dtype.lower()]
+        if self.binary:
+            dtype = np.dtype('>' + dtype)
+            end = self.pos + count * dtype.itemsize
+            values = np.frombuffer(self.buf, dtype=dtype, count=count,
+                                   offset=self.pos)
+            self.pos = end
+            return values.astype(dtype.newbyteorder('='))
+        # text parsed in chunks ending at line ends, so that the rest of the
+        # file is not split for every array
+        parts = []
+        while count > 0 and self.pos < len(self.buf):
+            end = self.buf.find(b'\n', self.pos + ASCII_CHUNK)
+            if end == -1:
+                end = len(self.buf)
+            tokens = self.buf[self.pos:end].split(None, count)
+            if len(tokens) > count:
+                self.pos = end - len(tokens.pop())
+            else:
+                self.pos = end
+            parts.append(np.array(tokens, dtype=float))
+            count -= len(tokens)
+        if count > 0:
+            raise ValueError(f'{self.path}: unexpected end of file')
+        return np.concatenate(parts).astype(dtype) if parts else \
+            np.zeros(0, dtype=dtype)
+
+
+def latest_vtk(vtk_dir):
+    """ Return path of the VTK file of the latest time in the directory
+        (foamToVTK names the files <name>_<time>.vtk) """
+    def vtk_time(name):
+        match = re.search(r'_(\d+(?:\.\d+)?)\.vtk$', name)
+        return float(match.group(1)) if match else -1
+
+    vtks = [name for name in os.listdir(vtk_dir) if name.endswith('.vtk')]
+    if not vtks:
+        raise FileNotFoundError(f'No VTK files found in {vtk_dir}')
+    return os.path.join(vtk_dir, max(vtks, key=vtk_time))
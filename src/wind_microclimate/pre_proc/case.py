@@ -1,4 +1,4 @@
-import os, sys, math, shutil
+import os, sys, math, shutil, stat
 from pathlib import Path
 from abc import ABC, abstractmethod
 from PyFoam.RunDictionary.BoundaryDict import BoundaryDict
@@ -44,19 +44,33 @@ class Case(ABC):
         for outlet in outlets:
             self.set_outlet(outlet)
 
-    def prepare_mesh(self, msh_dir):
+    def prepare_mesh(self, msh_dir, pool=None, cache=None):
         """ Execute all mesh preparation activities - cleaning, converting msh file, 
         setting default boundary types and renumbering (reordering cells for 
-        computational speed optimization) """
-        self.mesh = Mesh(msh_dir, self.case_path)
+        computational speed optimization). Skipped if the mesh was converted 
+        from the same msh file already (artifact cache given) """
+        self.mesh = Mesh(msh_dir, self.case_path, pool=pool)
         if self.mesh.cleaned:
             info('Mesh already cleaned')
         else:
             self.mesh.clean_msh()
+        poly_mesh = os.path.join(self.case_path, 'constant', 'polyMesh')
+        if cache is not None:
+            key = cache.key('mesh', Path(self.mesh.msh_file))
+            if cache.fresh('mesh', key):
+                info('Mesh already converted from the same msh file')
+                return
+        if is_shared(poly_mesh):
+            # mesh files linked to cloned cases are read-only, the new mesh
+            # is written to new files (the clones keep the old ones)
+            info('Removing mesh shared with cloned cases...')
+            shutil.rmtree(poly_mesh)
         self.mesh.convert_msh()
         self.set_boundaries()
         self.read_bc()
         self.mesh.renumber_mesh()
+        if cache is not None:
+            cache.record('mesh', key, [poly_mesh])
         # write boundary conditions from scratch as they get affected during 
         # renumbering and a 'template case' syntax is disrupted
         self.write_bc()
@@ -123,19 +137,50 @@ class Case(ABC):
             error(f'There is no "constant" directory in {self.case_path}')
             sys.exit()
 
-    def clone(self, clone_dir, angle):
+    def clone(self, clone_dir, angle, share_mesh=False, cache=None,
+              cache_inputs=()):
         """ Clone case into clone_dir and return the resultant Case object.
-            Skip cloning if such path exists and is a valid case directory """
+            Skip cloning if such path exists and is a valid case directory. 
+            With share_mesh the mesh is linked instead of copied. With the 
+            artifact cache, a clone made (and calculated) from other inputs 
+            of the template case is removed and cloned again. """
         clone_path = str(Path(clone_dir, os.path.split(self.case_path)[1]
                           + f'_{angle}'))
+        if cache is not None:
+            stage = f'case/{os.path.basename(clone_path)}'
+            key = cache.key(stage, *cache_inputs)
+            cache.invalidate(stage, key, [clone_path])
         if not os.path.exists(clone_path) \
                 or (os.path.exists(clone_path) \
                     and not SolutionDirectory(clone_path).isValid()):
             info(f'Creating case {clone_path}...')
             Path(clone_path).mkdir(parents=True, exist_ok=True)
-            self.foam_obj.cloneCase(clone_path)
+            if share_mesh:
+                self.clone_shared_mesh(clone_path)
+            else:
+                self.foam_obj.cloneCase(clone_path)
+        if cache is not None:
+            cache.record(stage, key, [clone_path])
         return self.return_clone(clone_path, angle)
 
+    def clone_shared_mesh(self, clone_path):
+        """ Copy the case directories (0, constant, system) except for the 
+            mesh, which is the same for all wind directions - mesh files are 
+            hard-linked (symlinked across file systems) and made read-only """
+        constant = os.path.join(self.case_path, 'constant')
+        if os.path.exists(clone_path):
+            shutil.rmtree(clone_path)
+        os.mkdir(clone_path)
+        ignore_mesh = lambda directory, names: \
+            ['polyMesh'] if os.path.samefile(directory, constant) else []
+        for essential in self.foam_obj.essential:
+            if essential is not None and os.path.isdir(essential):
+                shutil.copytree(essential, os.path.join(
+                    clone_path, os.path.basename(essential)),
+                    symlinks=True, ignore=ignore_mesh)
+        link_tree(os.path.join(constant, 'polyMesh'),
+                  os.path.join(clone_path, 'constant', 'polyMesh'))
+
     def check_version(self):
         self.version = float(FoamInformation.foamVersionString())
         if not (5 <= self.version <= 8):
@@ -154,3 +199,34 @@ class Case(ABC):
     @abstractmethod
     def setup_template(self):
         pass
+
+
+def link_tree(src, dst):
+    """ Recreate directory tree src in dst with hard links to its files, or 
+        as a symlink to src if hard links are not possible (e.g. across file 
+        systems). The files are made read-only, so that the shared data 
+        cannot be changed in place by any of the cases. """
+    read_only = ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH)
+    try:
+        for root, dirs, files in os.walk(src):
+            target = os.path.join(dst, os.path.relpath(root, src))
+            os.makedirs(target, exist_ok=True)
+            for name in files:
+                path = os.path.join(root, name)
+                os.chmod(path, os.stat(path).st_mode & read_only)
+                os.link(path, os.path.join(target, name))
+    except OSError:
+        warning(f'Hard links to {src} not possible, linking the directory')
+        shutil.rmtree(dst, ignore_errors=True)
+        os.symlink(os.path.abspath(src), dst)
+
+
+def is_shared(directory):
+    """ Check if the directory contains files shared with other cases 
+        (read-only files linked by link_tree) """
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            st = os.stat(os.path.join(root, name))
+            if st.st_nlink > 1 or not st.st_mode & stat.S_IWUSR:
+                return True
+    return False
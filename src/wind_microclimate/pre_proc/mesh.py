@@ -1,16 +1,21 @@
-import os, sys, glob, multiprocessing
+import os, sys, glob
 from PyFoam.Applications.Runner import Runner
 from PyFoam.RunDictionary.SolutionDirectory import SolutionDirectory
 from logging import info, error
 
 from wind_microclimate.post_proc import helpers
 
+# size of the chunks [bytes] in which the msh file is cleaned
+CHUNK_SIZE = 1 << 24
+
 
 class Mesh:
 
-    def __init__(self, msh_dir, case_path):
+    def __init__(self, msh_dir, case_path, pool=None):
         self.cleaned = False
         self.case_path = case_path
+        # post-processing pool for background jobs
+        self.pool = pool
         self.find_msh(msh_dir)
 
     def find_msh(self, msh_dir):
@@ -27,33 +32,48 @@ class Mesh:
                 self.cleaned = True
             self.msh_file = msh_list[0]
 
-    def clean_msh(self, forbid_chars = ['[', ']']):
+    def clean_msh(self, forbid_chars=['[', ']'], chunk_size=CHUNK_SIZE):
         """ Clean the msh file - ANSYS v2021 msh files contain characters
-            ('['and ']') not readable by fluent3DMeshToFoam """
+            ('['and ']') not readable by fluent3DMeshToFoam. The file is 
+            processed in chunks of chunk_size bytes (constant memory), written 
+            to a temporary file and validated before it replaces the 
+            original. Carriage returns are removed as well (Unix newlines). """
         info('Cleaning mesh file...')
         msh_clean = self.msh_file.replace('.msh', '_clean.msh')
-        with open(self.msh_file) as f:
-            f_list = f.readlines()
-        new_list = []
-        for line in f_list:
-            for character in forbid_chars:
-                line = line.replace(character, '')
-            new_list.append(line)
-        with open(msh_clean, 'w') as f_new:
-            f_new.writelines(new_list)
+        delete = (''.join(forbid_chars) + '\r').encode()
+        tmp = msh_clean + '.tmp'
+        size = removed = 0
+        with open(self.msh_file, 'rb') as f, open(tmp, 'wb') as f_new:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                cleaned = chunk.translate(None, delete)
+                f_new.write(cleaned)
+                size += len(chunk)
+                removed += len(chunk) - len(cleaned)
+            f_new.flush()
+            os.fsync(f_new.fileno())
+        # every byte not removed has to be written
+        if size != os.path.getsize(self.msh_file) or \
+                os.path.getsize(tmp) != size - removed:
+            os.remove(tmp)
+            error(f'Cleaning of {self.msh_file} failed, the cleaned file ' +
+                  'is incomplete')
+            sys.exit()
+        os.replace(tmp, msh_clean)
+        info(f'{removed} characters removed from the mesh file')
         os.remove(self.msh_file)
         self.msh_file = msh_clean
 
     def convert_msh(self):
         """ Convert the Fluent's msh file to OpenFOAM files and run mesh check 
-            in the background"""
+            (in the background if a post-processing pool is given)"""
         info('Converting the mesh from Fluent to OpenFOAM...')
         Runner(args=['fluent3DMeshToFoam', '-case', self.case_path,
                      self.msh_file])
         checkMesh = [['checkMesh', '-case', self.case_path]]
-        p = multiprocessing.Process(target=helpers.init_sbp, args=(checkMesh, 
-            self.case_path, ),)
-        p.start()
+        if self.pool is not None:
+            self.pool.submit('checkMesh', checkMesh, self.case_path)
+        else:
+            helpers.Job('checkMesh', checkMesh, self.case_path).run()
 
     def renumber_mesh(self):
         """ Mesh renumbering - reorder cells to improve computational 
@@ -0,0 +1,149 @@
+""" Initial conditions of a wind direction case from the results of another
+    (calculated) wind direction
+
+    The internal fields (U, k, epsilon, p) of the calculated case are written
+    to the 0 directory of the new case, velocity vectors rotated about the
+    vertical axis by the difference of the wind directions. Boundary
+    conditions of the new case are kept. The mesh is shared by all wind
+    directions, so the values map cell to cell; the flow around the
+    buildings of a close direction is a much better initial guess than the
+    uniform field, so the solver converges in fewer iterations. Only ASCII
+    field files are supported.
+"""
+
+import os, re
+import numpy as np
+
+FIELDS = ['U', 'k', 'epsilon', 'p']
+
+INTERNAL_FIELD = re.compile(r'^[ \t]*internalField\s+', re.MULTILINE)
+
+
+def split_internal_field(text):
+    """ Split field file contents into the text before the internalField
+        entry, the value of the entry and the text after it """
+    match = INTERNAL_FIELD.search(text)
+    if match is None:
+        raise ValueError('internalField entry not found')
+    end = text.index(';', match.end())
+    return text[:match.start()], text[match.end():end].strip(), \
+        text[end + 1:]
+
+
+def parse_internal_field(value):
+    """ Return values of an internalField entry - array of shape (cells,) or
+        (cells, 3) for nonuniform lists, a number or a 3-vector for uniform
+        values """
+    kind, _, rest = value.partition(' ')
+    rest = rest.strip()
+    if kind == 'uniform':
+        numbers = np.array(rest.strip('()').split(), dtype=float)
+        return numbers[0] if numbers.size == 1 else numbers
+    if kind != 'nonuniform':
+        raise ValueError(f'Unsupported internalField: {value[:40]}')
+    match = re.match(r'List<(scalar|vector)>\s*(\d+)\s*\(', rest)
+    if match is None:
+        raise ValueError(f'Unsupported internalField: {value[:40]}')
+    n_cells = int(match.group(2))
+    body = rest[match.end():rest.rindex(')')]
+    numbers = np.array(body.replace('(', ' ').replace(')', ' ').split(),
+                       dtype=float)
+    n_comp = 3 if match.group(1) == 'vector' else 1
+    if numbers.size != n_cells * n_comp:
+        raise ValueError(f'Expected {n_cells} values, found '
+                         f'{numbers.size // n_comp}')
+    return numbers.reshape(n_cells, 3) if n_comp == 3 else numbers
+
+
+def format_internal_field(values):
+    """ Return internalField entry value for an array of scalars or
+        vectors """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 2:
+        rows = '\n'.join('(%.8g %.8g %.8g)' % tuple(v) for v in values)
+        kind = 'vector'
+    else:
+        rows = '\n'.join('%.8g' % v for v in values)
+        kind = 'scalar'
+    return f'nonuniform List<{kind}>\n{len(values)}\n(\n{rows}\n)\n'
+
+
+def read_internal_field(path):
+    with open(path) as f:
+        return parse_internal_field(split_internal_field(f.read())[1])
+
+
+def write_internal_field(path, values):
+    """ Replace internalField of the field file with given values, keeping
+        the header and boundary conditions; boundaryField references to
+        $internalField are replaced by the original value """
+    with open(path) as f:
+        before, value, after = split_internal_field(f.read())
+    after = after.replace('$internalField', value)
+    with open(path, 'w') as f:
+        f.write(f'{before}internalField   {format_internal_field(values)};'
+                f'{after}')
+
+
+def rotate_vectors(vectors, angle):
+    """ Rotate velocity vectors for a change of the wind direction by angle
+        [deg] (wind directions measured clockwise from north, as in
+        Case.setup_case) """
+    theta = np.radians(angle)
+    vectors = np.array(vectors, dtype=float)
+    x, y = vectors[..., 0].copy(), vectors[..., 1].copy()
+    vectors[..., 0] = x * np.cos(theta) + y * np.sin(theta)
+    vectors[..., 1] = -x * np.sin(theta) + y * np.cos(theta)
+    return vectors
+
+
+def angle_difference(angle, other):
+    """ Signed difference of wind directions within [-180, 180) """
+    return (angle - other + 180) % 360 - 180
+
+
+def initialise_fields(source_dir, target_dir, angle, fields=FIELDS):
+    """ Write internal fields from source_dir (time directory of the
+        calculated case) to target_dir (0 directory of the new case),
+        vector fields rotated by angle [deg]. Fields missing in either of
+        the directories are skipped; return names of initialised fields. """
+    initialised = []
+    for field in fields:
+        source = os.path.join(source_dir, field)
+        target = os.path.join(target_dir, field)
+        if not (os.path.exists(source) and os.path.exists(target)):
+            continue
+        values = read_internal_field(source)
+        if np.ndim(values) < (2 if field == 'U' else 1):
+            # uniform source field, nothing to gain
+            continue
+        if np.ndim(values) == 2:
+            values = rotate_vectors(values, angle)
+        write_internal_field(target, values)
+        initialised.append(field)
+    return initialised
+
+
+def latest_time(case_dir):
+    """ Return name of the latest time directory of the case (or of a
+        processor directory), None if there are no results yet """
+    if not os.path.isdir(case_dir):
+        return None
+    times = []
+    for name in os.listdir(case_dir):
+        try:
+            time = float(name)
+        except ValueError:
+            continue
+        if time > 0 and os.path.isdir(os.path.join(case_dir, name)):
+            times.append((time, name))
+    return max(times)[1] if times else None
+
+
+def nearest_source(angle, sources):
+    """ Return (case path, angle) of the calculated case (sources: case path
+        -> wind angle) with the wind direction closest to angle """
+    if not sources:
+        return None
+    return min(sources.items(),
+               key=lambda item: abs(angle_difference(angle, item[1])))
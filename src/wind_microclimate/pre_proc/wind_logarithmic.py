@@ -1,6 +1,6 @@
-import os, math, glob
+import os, glob
+import numpy as np
 from PyFoam.RunDictionary.ParameterFile import ParameterFile
-from scipy.integrate import quad
 from logging import info
 
 from wind_microclimate.pre_proc.case import Case
@@ -29,27 +29,12 @@ class WindLogarithmic(Case):
         # sets wind profile inputs
         self.set_ABL()
     
-    def calc_vref(self, z_ref=10, h_max=500, step=0.01):
+    def calc_vref(self, z_ref=10, h_max=500):
         """ Wind profile scaling - calculation of reference wind speed for the 
         site of interest based on the wind profile for measurement station and 
         surface roughness for the site of interest """
-        integrate = lambda func, a, b, f_args: \
-                        quad(func, a, b, args=f_args)[0]
-        log_profile_func = lambda z, rht, vref: \
-                        vref * math.log(z/rht) / math.log(z_ref/rht)
-
-        ref_profile_ave = integrate(log_profile_func, 0, h_max, (self.rht_epw, 
-            self.v_ref))/h_max
-        error = ref_profile_ave
-        i = 0
-        while abs(error) > step:
-            vref_site = self.v_ref - i * step
-            integral_site = integrate(log_profile_func, 0, h_max, (self.rht_site,
-                vref_site))
-            site_profile_ave = integral_site/h_max
-            error = ref_profile_ave - site_profile_ave
-            i += 1
-        return vref_site
+        return float(site_vref(self.v_ref, self.rht_epw, self.rht_site,
+                               z_ref=z_ref, h_max=h_max))
 
     def set_ABL(self):
         """ Set parameters (z0/rht and v_ref) for the atmospheric boundary layer 
@@ -88,3 +73,17 @@ class WindLogarithmic(Case):
     def return_clone(self, clone_path, angle):
         return WindLogarithmic(clone_path, self.rht_epw, self.rht_site,
                                self.z_ground, self.v_ref, angle=angle)
+
+
+def site_vref(v_ref, rht_epw, rht_site, z_ref=10, h_max=500):
+    """ Reference wind speed for the site, such that the average of its 
+    logarithmic profile over [0, h_max] equals the average of the profile of 
+    the measurement station. The average of v_ref * ln(z/z0) / ln(z_ref/z0) 
+    over [0, h] is v_ref * (ln(h/z0) - 1) / ln(z_ref/z0), so the speed is 
+    given in closed form. Arguments can be arrays (broadcast against each 
+    other), e.g. to tabulate the speed for a grid of roughnesses and station 
+    speeds. """
+    v_ref, rht_epw, rht_site = (np.asarray(a, dtype=float)
+                                for a in (v_ref, rht_epw, rht_site))
+    profile_ave = lambda rht: (np.log(h_max / rht) - 1) / np.log(z_ref / rht)
+    return v_ref * profile_ave(rht_epw) / profile_ave(rht_site)
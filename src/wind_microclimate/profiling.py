@@ -0,0 +1,161 @@
+""" Opt-in profiling of chosen pipeline stages
+
+    Stages are functions/methods named as Class.method (e.g.
+    LawsonWeibull.wind_microclimate, WeibullWeatherData.prepare_weibull,
+    VR.merge_vr) or module:qualified.name, listed (comma separated) in the
+    WIND_MICROCLIMATE_PROFILE environment variable or in the profile row of
+    the input sheet; 'all' profiles the default STAGES. Each call of a
+    profiled stage writes to the profiles directory:
+    - <stage>.<n>.prof: cProfile statistics (pstats, snakeviz, ...)
+    - <stage>.<n>.folded: collapsed stacks sampled during the call, one
+      'frame;frame;... count' line per stack (flamegraph.pl, speedscope)
+    Only the chosen stages are wrapped, when install is called; nothing is
+    changed (and nothing costs) if profiling is off.
+"""
+
+import os, sys, cProfile, inspect, threading, importlib, itertools, \
+    functools
+from collections import Counter
+from logging import info, warning
+
+ENV_VAR = 'WIND_MICROCLIMATE_PROFILE'
+# interval of the stack sampling [s]
+SAMPLE_INTERVAL = 0.005
+
+# threads with an active cProfile profiler (nested stages are sampled only)
+_active = threading.local()
+
+# profiled if 'all' is chosen
+STAGES = ['Mesh.clean_msh', 'WeibullWeatherData.prepare_weibull',
+          'VR.merge_vr', 'VR.calculate_vr', 'Lawson.calculate',
+          'LawsonWeibull.wind_microclimate', 'LawsonEpw.wind_microclimate']
+
+# modules searched for the classes of Class.method stage names
+MODULES = ['wind_microclimate.pre_proc.mesh',
+           'wind_microclimate.pre_proc.case',
+           'wind_microclimate.weather.weibull',
+           'wind_microclimate.weather.epw',
+           'wind_microclimate.post_proc.vr',
+           'wind_microclimate.post_proc.vr_store',
+           'wind_microclimate.post_proc.lawson',
+           'wind_microclimate.post_proc.lawson_weibull',
+           'wind_microclimate.post_proc.lawson_epw',
+           'wind_microclimate.solver.solver']
+
+
+def chosen_stages(setting=None):
+    """ Return names of the stages to profile, from the environment
+        variable or else from the setting (input sheet) """
+    setting = os.environ.get(ENV_VAR) or setting
+    if not setting:
+        return []
+    stages = [s.strip() for s in str(setting).split(',') if s.strip()]
+    return STAGES if stages == ['all'] else stages
+
+
+def install(stages, output_dir):
+    """ Wrap the stages with the profiler, return names of the wrapped
+        stages """
+    installed = []
+    for stage in stages:
+        try:
+            owner, attr = resolve(stage)
+        except (ImportError, AttributeError, ValueError):
+            warning(f'Profiling: stage {stage} not found')
+            continue
+        # static and class methods are wrapped as such again
+        static = inspect.getattr_static(owner, attr)
+        if isinstance(static, (staticmethod, classmethod)):
+            wrapper = type(static)(profiled(static.__func__, stage,
+                                            str(output_dir)))
+        else:
+            wrapper = profiled(getattr(owner, attr), stage, str(output_dir))
+        setattr(owner, attr, wrapper)
+        installed.append(stage)
+    if installed:
+        os.makedirs(output_dir, exist_ok=True)
+        info(f'Profiling {", ".join(installed)} into {output_dir}')
+    return installed
+
+
+def resolve(stage):
+    """ Return (object, attribute name) of the stage function """
+    if ':' in stage:
+        module_name, qualname = stage.split(':')
+        modules = [module_name]
+    else:
+        qualname, modules = stage, MODULES
+    *path, attr = qualname.split('.')
+    for module_name in modules:
+        owner = importlib.import_module(module_name)
+        try:
+            for name in path:
+                owner = getattr(owner, name)
+        except AttributeError:
+            continue
+        # only attributes defined in this module (not imported ones)
+        if hasattr(owner, attr) and (path or getattr(
+                getattr(owner, attr), '__module__', None) == module_name):
+            return owner, attr
+    raise AttributeError(stage)
+
+
+def profiled(func, stage, output_dir):
+    """ Return func wrapped with cProfile and the stack sampler """
+    calls = itertools.count(1)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        prefix = os.path.join(output_dir, f'{stage}.{next(calls)}')
+        profile = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        if getattr(_active, 'profile', None) is None:
+            _active.profile = profile
+            profile.enable()
+        else:
+            # the enclosing stage is profiled, its profile includes this one
+            profile = None
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+                _active.profile = None
+                profile.dump_stats(prefix + '.prof')
+            sampler.stop()
+            sampler.write(prefix + '.folded')
+    return wrapper
+
+
+class StackSampler(threading.Thread):
+    """ Samples stacks of a thread at regular intervals """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} '
+                             f'({os.path.basename(code.co_filename)}:'
+                             f'{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
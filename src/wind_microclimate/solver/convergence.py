@@ -0,0 +1,141 @@
+""" Convergence monitor of the CFD calculation
+
+    The solver log is parsed while it is written. The calculation is
+    stopped (results written) once the initial residuals of the chosen
+    fields drop below their tolerances, and stopped without writing
+    results if it diverges - residuals not finite or grown by more than
+    divergence_factor above their minimum. The solver is stopped through
+    its controlDict (stopAt writeNow/noWriteNow), which OpenFOAM re-reads
+    while running, so it works the same for parallel runs.
+
+    ResidualMonitor only consumes lines, so it can be checked against
+    recorded or synthetic logs:
+        monitor = ResidualMonitor({'p': 1e-4, 'U': 1e-5})
+        for line in open('log.simpleFoam'):
+            if monitor.feed(line) != RUNNING:
+                break
+"""
+
+import os, re, time, math
+
+RUNNING = 'running'
+CONVERGED = 'converged'
+DIVERGED = 'diverged'
+
+TIME_LINE = re.compile(r'^Time = (\S+)')
+RESIDUAL_LINE = re.compile(r'Solving for (\w+), Initial residual = ([^,\s]+)')
+END_LINE = re.compile(r'^End\s*$')
+# growth of residuals is measured from at least this minimum
+MIN_RESIDUAL = 1e-12
+
+
+def parse_tolerances(text):
+    """ Return tolerances {field: tolerance} from text such as
+        'p: 1e-4, U: 1e-5' (U stands for all of its components) """
+    tolerances = {}
+    for item in str(text).split(','):
+        if item.strip():
+            field, tolerance = item.split(':')
+            tolerances[field.strip()] = float(tolerance)
+    return tolerances
+
+
+class ResidualMonitor:
+    """ Residuals of the solver log, time step by time step """
+
+    def __init__(self, tolerances=None, divergence_factor=None):
+        self.tolerances = tolerances or {}
+        self.divergence_factor = divergence_factor
+        self.status = RUNNING
+        self.reason = ''
+        # time of the last finished time step
+        self.time = None
+        # time step being read and initial residuals of its fields (first
+        # solution of each field in the time step)
+        self.current = None
+        self.residuals = {}
+        self.minimum = {}
+
+    def feed(self, line):
+        """ Process a line of the log, return status of the calculation """
+        if self.status != RUNNING:
+            return self.status
+        line = line.strip()
+        match = TIME_LINE.match(line)
+        if match is not None or END_LINE.match(line):
+            self.end_step()
+            self.current = match.group(1) if match is not None else None
+            return self.status
+        match = RESIDUAL_LINE.search(line)
+        if match is not None:
+            field = match.group(1)
+            try:
+                value = float(match.group(2))
+            except ValueError:
+                value = math.nan
+            if not math.isfinite(value):
+                self.stop(DIVERGED, f'{field} residual is {match.group(2)} '
+                                    f'at time {self.current}')
+            self.residuals.setdefault(field, value)
+        return self.status
+
+    def end_step(self):
+        """ Check initial residuals of the finished time step """
+        if not self.residuals:
+            return
+        self.time = self.current
+        residuals, self.residuals = self.residuals, {}
+        for field, value in residuals.items():
+            minimum = self.minimum.get(field)
+            if self.divergence_factor is not None and minimum is not None \
+                    and value > self.divergence_factor * max(minimum,
+                                                             MIN_RESIDUAL):
+                self.stop(DIVERGED, f'{field} residual {value:g} at time '
+                          f'{self.time} (minimum {minimum:g})')
+                return
+            # zero residuals (e.g. Uz of a flat flow) give no scale of growth
+            if value > 0:
+                self.minimum[field] = value if minimum is None \
+                    else min(minimum, value)
+        if self.tolerances and all(
+                self.field_residual(residuals, field) <= tolerance
+                for field, tolerance in self.tolerances.items()):
+            self.stop(CONVERGED, f'residuals below tolerances at time '
+                      f'{self.time}')
+
+    def field_residual(self, residuals, field):
+        """ Initial residual of the field, the largest of its components for
+            vector fields (U -> Ux, Uy, Uz); inf if not solved for """
+        values = [value for name, value in residuals.items()
+                  if name == field or (name[:-1] == field and
+                                       name[-1] in 'xyz')]
+        return max(values) if values else math.inf
+
+    def stop(self, status, reason):
+        self.status = status
+        self.reason = reason
+
+
+def follow(path, done, poll=1.):
+    """ Yield lines of the file as it is written, until done (Event) is set
+        and the whole file is read """
+    while not os.path.exists(path):
+        if done.is_set():
+            return
+        time.sleep(poll)
+    with open(path) as f:
+        partial = ''
+        while True:
+            finished = done.is_set()
+            chunk = f.read()
+            if chunk:
+                lines = (partial + chunk).split('\n')
+                partial = lines.pop()
+                for line in lines:
+                    yield line
+            elif finished:
+                if partial:
+                    yield partial
+                return
+            else:
+                time.sleep(poll)
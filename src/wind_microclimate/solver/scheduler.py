@@ -0,0 +1,69 @@
+import time, multiprocessing
+from multiprocessing.connection import wait
+from logging import info, warning
+
+
+class Scheduler:
+    """ Run CFD calculations of several wind direction cases at the same
+        time, keeping the total number of processors in use within a budget.
+        Each case is calculated in a separate process by its Solver. """
+
+    def __init__(self, total_processors, on_finish=None):
+        self.total_processors = total_processors
+        # called with the Solver object of every calculated case
+        self.on_finish = on_finish
+        self.timings = {}
+
+    def run(self, solvers):
+        """ Take solvers (one per wind direction case) from the queue and
+            calculate the cases as soon as there are enough free processors.
+            Cases calculated already are not run again. Return wall time
+            [s] of each case. """
+        queue = iter(solvers)
+        running = {}
+        free = self.total_processors
+        pending = next(queue, None)
+        while pending is not None or running:
+            # start cases while the next one fits in the processor budget,
+            # cases calculated already are passed on straight away
+            while pending is not None and (pending.calculated or
+                    pending.processors <= free or not running):
+                if pending.calculated:
+                    info(f'{pending.case.case_path} already calculated')
+                    self.finish(pending, 0)
+                else:
+                    info(f'Starting calculation of {pending.case.case_path} ' +
+                         f'on {pending.processors} processors...')
+                    p = multiprocessing.Process(target=pending.calculate_cfd)
+                    p.start()
+                    running[p.sentinel] = (p, pending, time.time())
+                    free -= pending.processors
+                pending = next(queue, None)
+            # wait for any of the running cases to finish (nothing runs if
+            # the remaining cases were calculated already, wait would block)
+            if not running:
+                continue
+            for sentinel in wait(list(running)):
+                p, sol, start = running.pop(sentinel)
+                p.join()
+                free += sol.processors
+                self.finish(sol, time.time() - start, p.exitcode)
+        self.summary()
+        return self.timings
+
+    def finish(self, sol, wall_time, exitcode=0):
+        """ Record wall time of the case and pass it on if calculated """
+        self.timings[sol.case.case_path] = wall_time
+        sol.calculated = sol.is_calculated()
+        if exitcode != 0 or not sol.calculated:
+            warning(f'Calculation of {sol.case.case_path} failed ' +
+                    f'(exit code {exitcode})')
+            return
+        info(f'{sol.case.case_path} calculated, wall time: {wall_time:.1f} s')
+        if self.on_finish is not None:
+            self.on_finish(sol)
+
+    def summary(self):
+        lines = [f'\n\t{case}: {wall_time:.1f} s'
+                 for case, wall_time in self.timings.items()]
+        info('Wall time of CFD calculations:' + ''.join(lines))
@@ -1,66 +1,318 @@
-import os, subprocess, time
+import os, time, glob, shutil, json, threading
 from pathlib import Path
+from PyFoam import configuration
 from PyFoam.RunDictionary.ParsedParameterFile import ParsedParameterFile
 from PyFoam.Applications.Decomposer import Decomposer
 from PyFoam.Applications.PlotRunner import PlotRunner
-from logging import warning
+from PyFoam.Applications.Runner import Runner
+from logging import info, warning, error
+
+from wind_microclimate import telemetry
+from wind_microclimate.pre_proc.case import link_tree
+from wind_microclimate.pre_proc.warm_start import initialise_fields, \
+    latest_time, nearest_source, angle_difference
+from wind_microclimate.solver.convergence import ResidualMonitor, follow, \
+    RUNNING, CONVERGED, DIVERGED
+
+# written to warm started cases: source case and number of iterations
+WARM_START_FILE = 'warmStart.json'
+# written by the convergence monitor: status, time and tolerances
+CONVERGENCE_FILE = 'convergence.json'
+# log of the solver written by PlotRunner
+SOLVER_LOG = 'PyFoamRunner.simpleFoam.logfile'
 
 
 class Solver:
 
-    def __init__(self, case, processors, iterations, save_residuals=False):
+    def __init__(self, case, processors, iterations, save_residuals=False,
+                 template=None, warm_start=None, warm_start_iter=None,
+                 tolerances=None, divergence_factor=None, concurrent=False):
         self.case = case
+        # template case decomposed once (decompose_template), only fields 
+        # are decomposed for this case if given
+        self.template = template
         self.processors = processors
+        self.max_iterations = iterations
         self.iterations = iterations
+        # calculated cases (case path -> wind angle), the case is initialised
+        # from the closest of them and calculated for warm_start_iter
+        # iterations; filled in while the other cases finish
+        self.warm_start_sources = warm_start
+        self.warm_start_iter = warm_start_iter or iterations
+        # residual tolerances (field -> tolerance) the calculation stops at,
+        # diverging calculations are stopped if any of them is given
+        self.tolerances = tolerances or {}
+        self.divergence_factor = divergence_factor
         self.calculated = self.is_calculated()
-        self.solver_args = [f'--procnr={self.processors}', '--no-pickled-file',
-                        '--no-continuity', '--non-persist', 'simpleFoam', 
-                        '-case', self.case.case_path]
+        # no PyFoam server processes if other cases run at the same time
+        self.pyfoam_args = server_args(concurrent)
+        self.solver_args = self.pyfoam_args + [f'--procnr={self.processors}',
+                        '--no-pickled-file', '--no-continuity', '--non-persist',
+                        'simpleFoam', '-case', self.case.case_path]
         self.save_residuals = save_residuals
         if self.save_residuals:
-            self.solver_args.insert(1, '--hardcopy')
+            # unique image name, as several cases may be calculated at once
+            self.resid_prefix = os.path.basename(self.case.case_path)
+            self.solver_args.insert(0, '--hardcopy')
+            self.solver_args.insert(1, f'--prefix-hardcopy={self.resid_prefix}')
             self.resid_dir = os.path.join(os.path.dirname(self.case.case_path),
                                           'residuals')
 
     def calculate_cfd(self):
         if not self.calculated:
-            self.decompose()
+            name = os.path.basename(self.case.case_path)
+            source = self.warm_start_source()
+            # reconstructed results of the source initialise the fields 
+            # before decomposition, decomposed ones after it
+            if source is not None and source[2] is None:
+                self.warm_start(source)
+            with telemetry.stage('decompose', name, children=True) as record:
+                record['exit_status'] = 0 if self.decompose() else 1
+            if source is not None and source[2] is not None:
+                self.warm_start(source)
             self.set_iter()
-            self.run_simulation()
+            with telemetry.stage('solve', name, children=True) as record:
+                record['exit_status'] = 0 if self.run_simulation() else 1
+                record['iterations'] = self.last_time()
 
     def run_simulation(self):
-        PlotRunner(args=self.solver_args)
+        """ Run the solver, return True if it ended without errors """
+        if not (self.tolerances or self.divergence_factor):
+            runner = PlotRunner(args=self.solver_args)
+        else:
+            runner = self.run_monitored()
         if self.save_residuals:
             self.residuals_plot()
+        return runner.getData().get('OK', False)
+
+    def run_monitored(self):
+        """ Run the solver while the convergence monitor reads its log,
+            return the solver runner """
+        log = os.path.join(self.case.case_path, SOLVER_LOG)
+        if os.path.exists(log):
+            # left from a previous run
+            os.remove(log)
+        marker = os.path.join(self.case.case_path, CONVERGENCE_FILE)
+        if os.path.exists(marker):
+            os.remove(marker)
+        monitor = ResidualMonitor(self.tolerances, self.divergence_factor)
+        done = threading.Event()
+        watcher = threading.Thread(target=self.watch, args=(monitor, log, done),
+                                   daemon=True)
+        watcher.start()
+        runner = PlotRunner(args=self.solver_args)
+        done.set()
+        watcher.join()
+        self.record_convergence(monitor)
+        return runner
+
+    def watch(self, monitor, log, done):
+        """ Feed the solver log to the monitor, stop the solver once it 
+            converges or diverges """
+        for line in follow(log, done):
+            if monitor.feed(line) != RUNNING:
+                self.stop_solver(write=monitor.status == CONVERGED)
+                return
+
+    def stop_solver(self, write=True):
+        """ Stop the running solver at the current time step (results 
+            written or not); OpenFOAM re-reads the modified controlDict """
+        conDict = ParsedParameterFile(os.path.join(self.case.case_path, 'system', 
+            'controlDict'))
+        conDict['stopAt'] = 'writeNow' if write else 'noWriteNow'
+        conDict.writeFile()
+
+    def record_convergence(self, monitor):
+        """ Write the outcome of a monitored calculation """
+        if monitor.status == RUNNING:
+            return
+        if monitor.status == CONVERGED:
+            info(f'{self.case.case_path} converged: {monitor.reason}')
+        else:
+            error(f'{self.case.case_path} diverged: {monitor.reason}, '
+                  'calculation stopped')
+        with open(os.path.join(self.case.case_path, CONVERGENCE_FILE), 'w') as f:
+            json.dump({'status': monitor.status, 'reason': monitor.reason,
+                       'time': self.last_time(),
+                       'tolerances': self.tolerances}, f)
 
     def decompose(self):
         """ Check if case decomposed to provided number of processors, 
-            then decompose if not """
+            then decompose if not; return True if the case is decomposed """
+        if self.template is not None:
+            # decomposed results are continued from (more iterations)
+            if latest_time(os.path.join(self.case.case_path,
+                                        'processor0')) is None:
+                return self.decompose_fields()
+            return True
         if self.case.foam_obj.nrProcs() != self.processors:
             if self.case.foam_obj.nrProcs() != 0:
-                subprocess.run(['reconstructPar', '-case', self.case.case_path, 
-                    '-latestTime'])
-            Decomposer(args=[self.case.case_path, self.processors, '--clear'])
+                telemetry.run(['reconstructPar', '-case', self.case.case_path, 
+                    '-latestTime'], direction=os.path.basename(
+                    self.case.case_path))
+            # Decomposer only writes decomposeParDict: it always starts a 
+            # server process for decomposePar and keeps no status of its run
+            Decomposer(args=[self.case.case_path, self.processors, '--clear',
+                             '--no-decompose'])
+            runner = Runner(args=self.pyfoam_args + ['decomposePar',
+                '-noFunctionObjects', '-case', self.case.case_path])
+            return runner.getData().get('OK', False)
+        return True
+
+    def decompose_fields(self):
+        """ Link the mesh decomposition of the template case and decompose 
+            only the fields (boundary conditions of the wind direction) """
+        case_path = self.case.case_path
+        for proc_dir in glob.glob(os.path.join(case_path, 'processor*')):
+            if not os.path.exists(os.path.join(self.template.case_path,
+                                               os.path.basename(proc_dir))):
+                # left from a decomposition to more processors
+                shutil.rmtree(proc_dir)
+        for i in range(self.processors):
+            proc_constant = os.path.join(f'processor{i}', 'constant')
+            if not os.path.exists(os.path.join(case_path, proc_constant)):
+                link_tree(os.path.join(self.template.case_path, proc_constant),
+                          os.path.join(case_path, proc_constant))
+        runner = Runner(args=self.pyfoam_args + ['decomposePar', '-fields',
+                                                 '-case', case_path])
+        return runner.getData().get('OK', False)
+
+    def warm_start_source(self):
+        """ Return (case path, wind angle, processor directories or None) of
+            the calculated case the fields are initialised from; None if
+            warm start is off, there is no calculated case yet or this case
+            has results already """
+        if self.warm_start_sources is None:
+            return None
+        case_path = self.case.case_path
+        if latest_time(case_path) is not None or \
+                latest_time(os.path.join(case_path, 'processor0')) is not None:
+            return None
+        source = nearest_source(self.case.angle, self.warm_start_sources)
+        if source is None:
+            return None
+        source_path, angle = source
+        # cases sharing the template decomposition map processor to
+        # processor, so the source need not be reconstructed yet
+        if self.template is not None and latest_time(
+                os.path.join(source_path, 'processor0')) is not None:
+            return source_path, angle, [f'processor{i}'
+                                        for i in range(self.processors)]
+        if latest_time(source_path) is not None:
+            return source_path, angle, None
+        return None
+
+    def warm_start(self, source):
+        """ Initialise the fields from the results of the calculated case 
+            with the closest wind direction, velocity rotated by the 
+            difference of the wind directions """
+        source_path, angle, proc_dirs = source
+        diff = angle_difference(self.case.angle, angle)
+        try:
+            for sub_dir in proc_dirs or ['']:
+                source_dir = os.path.join(source_path, sub_dir)
+                initialise_fields(
+                    os.path.join(source_dir, latest_time(source_dir)),
+                    os.path.join(self.case.case_path, sub_dir, '0'), diff)
+        except (OSError, TypeError, ValueError) as e:
+            warning(f'{self.case.case_path}: warm start from {source_path} '
+                    f'failed ({e}), calculated from the initial fields')
+            return
+        info(f'{self.case.case_path}: fields initialised from {source_path} '
+             f'(rotated by {diff} deg), {self.warm_start_iter} iterations')
+        with open(os.path.join(self.case.case_path, WARM_START_FILE), 'w') as f:
+            json.dump({'source': source_path, 'angle': angle,
+                       'iterations': self.warm_start_iter}, f)
+        self.iterations = self.warm_start_iter
 
     def set_iter(self):
         conDict = ParsedParameterFile(os.path.join(self.case.case_path, 'system', 
             'controlDict'))
         conDict['endTime'] = self.iterations
+        # continued from the latest results, e.g. if iterations were added
+        # or the calculation was stopped by the convergence monitor
+        conDict['startFrom'] = 'latestTime'
+        conDict['stopAt'] = 'endTime'
         conDict.writeFile()
 
-    def residuals_plot(self):
+    def residuals_plot(self, timeout=10):
+        """ Move the PNG image of residuals (written by gnuplot once the 
+            solver finishes) to the residuals directory """
         Path(self.resid_dir).mkdir(parents=True, exist_ok=True)
-        # make sure image with residuals has been created
-        time.sleep(2)
+        image = f'{self.resid_prefix}.linear.png'
+        # wait until the image is created and no longer growing
+        size = -1
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if os.path.exists(image) and os.path.getsize(image) == size > 0:
+                break
+            size = os.path.getsize(image) if os.path.exists(image) else -1
+            time.sleep(0.2)
         try:
-            # PNG image of residuals
-            subprocess.run(['mv', 'linear.png', os.path.join(self.resid_dir,
-                f'residuals_{self.case.angle}.png')])
-        except Exception:
+            shutil.move(image, os.path.join(self.resid_dir,
+                        f'residuals_{self.case.angle}.png'))
+        except OSError:
             warning('Image with residuals was not generated')
     
     def is_calculated(self):
-        if int(self.case.foam_obj.getLast()) != self.iterations:
+        # warm started cases are calculated for fewer iterations
+        marker = os.path.join(self.case.case_path, WARM_START_FILE)
+        if os.path.exists(marker):
+            with open(marker) as f:
+                self.iterations = json.load(f)['iterations']
+        else:
+            self.iterations = self.max_iterations
+        # converged cases stop before the last iteration
+        marker = os.path.join(self.case.case_path, CONVERGENCE_FILE)
+        if os.path.exists(marker):
+            with open(marker) as f:
+                convergence = json.load(f)
+            if convergence['status'] == CONVERGED and \
+                    convergence['tolerances'] == self.tolerances and \
+                    convergence['time'] == self.last_time():
+                self.iterations = convergence['time']
+                return True
+        if self.last_time() != self.iterations:
             return False
         else:
             return True
+
+    def last_time(self):
+        """ Latest time of the results, reconstructed or still in the
+            processor directories after a parallel run """
+        times = [latest_time(self.case.case_path),
+                 latest_time(os.path.join(self.case.case_path, 'processor0'))]
+        times = [float(t) for t in times if t is not None]
+        return int(max(times)) if times else 0
+
+
+def decompose_template(case, processors):
+    """ Decompose mesh of the template case for the given number of 
+        processors, unless it is decomposed already and not older than the 
+        mesh. Wind direction cases share this decomposition. """
+    mesh = os.path.join(case.case_path, 'constant', 'polyMesh')
+    proc_mesh = os.path.join(case.case_path, 'processor0', 'constant',
+                             'polyMesh')
+    if case.foam_obj.nrProcs() == processors and os.path.exists(proc_mesh) \
+            and newest_mtime(mesh) <= newest_mtime(proc_mesh):
+        info('Template case already decomposed')
+        return
+    info(f'Decomposing template case for {processors} processors...')
+    Decomposer(args=[case.case_path, processors, '--clear'])
+
+
+def server_args(concurrent):
+    """ PyFoam arguments of the applications: no server process (network
+        control of the run) if several cases are calculated at once, their
+        servers would compete for the same ports """
+    if concurrent and configuration().getboolean('Network',
+                                                 'startServerThread'):
+        return ['--no-server-process']
+    return []
+
+
+def newest_mtime(directory):
+    """ Modification time of the newest file in the directory tree """
+    return max((os.path.getmtime(os.path.join(root, name))
+                for root, dirs, files in os.walk(directory)
+                for name in files), default=0)
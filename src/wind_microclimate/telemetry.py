@@ -0,0 +1,158 @@
+""" Structured telemetry of the pipeline stages
+
+    Each stage (mesh conversion, clone, decompose, solve, reconstruct, VTK,
+    VR, Weibull fit, Lawson, render) of each wind direction appends one JSON
+    line to the telemetry file:
+        {"stage": "solve", "direction": "case_30.0", "start": ...,
+         "wall_time": ..., "cpu_time": ..., "max_rss_kb": ...,
+         "read_bytes": ..., "write_bytes": ..., "exit_status": 0,
+         "run": "20240101-120000-3f9c2a1e"}
+    Records carry the id of the run (configure call) they belong to; the
+    file keeps the records of all runs of the project, the summary covers
+    the current run only.
+    Commands are measured exactly (resource usage of the child process).
+    Stages run in Python are measured for the calling thread, plus the
+    child processes waited for during the stage if children is set.
+    Like logging, telemetry is configured once (configure) and used
+    through module-level functions; processes forked afterwards (CFD
+    calculations) append to the same file. Nothing is recorded until
+    configure is called.
+"""
+
+import os, json, time, uuid, threading, resource, subprocess
+from contextlib import contextmanager
+from logging import info
+
+import pandas as pd
+
+# usage of the calling thread, where supported (Linux)
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+# rusage blocks are 512 bytes
+BLOCK = 512
+
+_path = None
+_run = None
+_lock = threading.Lock()
+
+
+def configure(path):
+    """ Start recording (a new run) to the JSON-lines file """
+    global _path, _run
+    _path = str(path)
+    _run = time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:8]
+
+
+def write(record):
+    """ Append a record (one line, so that records of concurrent processes
+        do not mix) """
+    if _path is None:
+        return
+    line = json.dumps(dict(record, run=_run), default=str) + '\n'
+    with _lock:
+        with open(_path, 'a') as f:
+            f.write(line)
+
+
+def usage(who):
+    u = resource.getrusage(who)
+    return u.ru_utime + u.ru_stime, u.ru_inblock, u.ru_oublock, u.ru_maxrss
+
+
+@contextmanager
+def stage(name, direction=None, children=False):
+    """ Record the stage run in the with block; yields the record, so that
+        fields can be added to it (exit_status is 1 if an exception is
+        raised, else as set in the block or 0). With children, resources of
+        the child processes waited for during the stage are added. """
+    record = {'stage': name, 'direction': direction, 'pid': os.getpid(),
+              'start': time.time()}
+    if _path is None:
+        yield record
+        return
+    start = time.perf_counter()
+    before = usage(RUSAGE_THREAD)
+    before_children = usage(resource.RUSAGE_CHILDREN) if children else None
+    try:
+        yield record
+    except BaseException:
+        record['exit_status'] = 1
+        raise
+    else:
+        # status of the program run in the block, if set there
+        record.setdefault('exit_status', 0)
+    finally:
+        after = usage(RUSAGE_THREAD)
+        cpu, read, written = (after[i] - before[i] for i in range(3))
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if children:
+            after_children = usage(resource.RUSAGE_CHILDREN)
+            cpu += after_children[0] - before_children[0]
+            read += after_children[1] - before_children[1]
+            written += after_children[2] - before_children[2]
+            max_rss = max(max_rss, after_children[3])
+        record.update(wall_time=time.perf_counter() - start, cpu_time=cpu,
+                      max_rss_kb=max_rss, read_bytes=read * BLOCK,
+                      write_bytes=written * BLOCK)
+        write(record)
+
+
+def run(cmd, name=None, direction=None, timeout=None, **kwargs):
+    """ Run the command (subprocess.Popen arguments) and record its resource
+        usage; return its exit code. On timeout the command is killed,
+        recorded with exit status None and TimeoutExpired raised. """
+    name = name or os.path.basename(cmd[0])
+    record = {'stage': name, 'direction': direction, 'start': time.time()}
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, **kwargs)
+    record['pid'] = proc.pid
+    timed_out = False
+    while True:
+        # waited for with wait4, which returns the usage of this process only
+        pid, status, rusage = os.wait4(proc.pid, os.WNOHANG if timeout
+                                       else 0)
+        if pid != 0:
+            break
+        if time.perf_counter() - start > timeout:
+            proc.kill()
+            timed_out = True
+            pid, status, rusage = os.wait4(proc.pid, 0)
+            break
+        time.sleep(0.1)
+    # negative signal number if killed, as subprocess reports it
+    proc.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) \
+        else os.WEXITSTATUS(status)
+    record.update(wall_time=time.perf_counter() - start,
+                  cpu_time=rusage.ru_utime + rusage.ru_stime,
+                  max_rss_kb=rusage.ru_maxrss,
+                  read_bytes=rusage.ru_inblock * BLOCK,
+                  write_bytes=rusage.ru_oublock * BLOCK,
+                  exit_status=None if timed_out else proc.returncode)
+    write(record)
+    if timed_out:
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return proc.returncode
+
+
+def summary(table=None):
+    """ Log totals of each stage (over all wind directions) of the current
+        run and write them to the table (csv) if given; return the totals """
+    if _path is None or not os.path.exists(_path):
+        return None
+    records = pd.read_json(_path, lines=True)
+    if 'run' not in records:
+        return None
+    records = records[records['run'] == _run]
+    if records.empty:
+        return None
+    records['failed'] = records['exit_status'] != 0
+    totals = records.groupby('stage', sort=False).agg(
+        runs=('stage', 'size'), failed=('failed', 'sum'),
+        wall_time=('wall_time', 'sum'), cpu_time=('cpu_time', 'sum'),
+        max_rss_kb=('max_rss_kb', 'max'), read_bytes=('read_bytes', 'sum'),
+        write_bytes=('write_bytes', 'sum'))
+    totals = totals.sort_values('wall_time', ascending=False)
+    info('Resources used by the pipeline stages:\n' +
+         totals.to_string(float_format=lambda x: f'{x:.1f}'))
+    if table is not None:
+        totals.to_csv(table)
+    return totals
@@ -1,11 +1,16 @@
-from pyepw.epw import EPW
 import sys, glob, os
 import pandas as pd
+from functools import lru_cache
 from logging import error, exception
 
 from wind_microclimate.weather.weather import WeatherData
 
 
+# positions of the wind fields in the hourly records of an epw file
+EPW_WIND_DIRECTION = 20
+EPW_WIND_SPEED = 21
+
+
 class EpwWeatherData(WeatherData):
 
     def __init__(self, input_dir):
@@ -26,24 +31,43 @@ class EpwWeatherData(WeatherData):
 
     def epw_to_df(self):
         """ Return dataframe with wind speeds and directions from the epw file """
-        epw = EPW()
-        df_list = []
         try:
-            epw.read(self.data_file)
-            wind_dat = []
-            for w in epw.weatherdata:
-                wind_dat.append([w.wind_direction, w.wind_speed])
-            # separate dataframes for seasons planned as a future development
-            df_list.append(pd.DataFrame(wind_dat, columns=[self.wd_col, self.ws_col]))
-            self.wind_data = df_list
+            wind_dir, wind_speed = read_epw_wind(self.data_file)
         except FileNotFoundError:
             exception(f'\n{self.data_file} file not found\n')
             sys.exit()
+        # separate dataframes for seasons planned as a future development
+        self.wind_data = [pd.DataFrame({self.wd_col: wind_dir,
+                                        self.ws_col: wind_speed})]
 
     def mean_ws_epw(self):
-        epw = EPW()
-        epw.read(self.data_file)
-        sum = 0
-        for w in epw.weatherdata:
-            sum += w.wind_speed
-        return sum / 8760
+        """ Return mean wind speed of all hourly records in the epw file """
+        wind_dir, wind_speed = read_epw_wind(self.data_file)
+        return float(wind_speed.mean())
+
+
+def read_epw_wind(epw_file):
+    """ Return wind directions and wind speeds from the epw file as read-only
+        numpy arrays. The file is parsed once per path and modification time,
+        so that all the steps of the calculation share the same result. """
+    epw_file = os.path.abspath(epw_file)
+    return _read_epw_wind(epw_file, os.stat(epw_file).st_mtime_ns)
+
+
+@lru_cache(maxsize=16)
+def _read_epw_wind(epw_file, mtime):
+    """ Parse only the wind columns of the hourly records in one pass """
+    # header lines (LOCATION, DESIGN CONDITIONS, ...) start with a letter
+    n_header = 0
+    with open(epw_file) as f:
+        for line in f:
+            if line[:1].isdigit():
+                break
+            n_header += 1
+    wind = pd.read_csv(epw_file, skiprows=n_header, header=None,
+                       usecols=[EPW_WIND_DIRECTION, EPW_WIND_SPEED],
+                       dtype=float).to_numpy()
+    wind_dir, wind_speed = wind[:, 0].copy(), wind[:, 1].copy()
+    wind_dir.flags.writeable = False
+    wind_speed.flags.writeable = False
+    return wind_dir, wind_speed
@@ -1,33 +1,55 @@
+import numpy as np
 import pandas as pd
 
 
+# first day of year of each season
+NORTHERN_SEASONS = {'spring': 80, 'summer': 172, 'autumn': 264, 'winter': 355}
+SOUTHERN_SEASONS = {'autumn': 80, 'winter': 172, 'spring': 264, 'summer': 355}
+
+
 class WeatherData:
 
     def __init__(self, data_file):
         self.data_file = data_file
         self.ws_col = 'windspeed'
         self.wd_col = 'winddir'
+        self.seasons = NORTHERN_SEASONS
     
-    def group_wind_data(self, df_wind, angles, wd_col):
-        """ Assign wind angle group to each record in weather data """
-        interval = angles[1] - angles[0]
-        df_wind['Direction'] = 0
-        for angle in angles:
-            mask_angle = (df_wind[wd_col].between(angle - interval/2, 
-                angle + interval/2, inclusive='right'))
-            df_wind.loc[mask_angle, 'Direction'] = angle
-        return df_wind
+    def group_wind_data(self, wind_dir, angles):
+        """ Return index of the wind angle group assigned to each record in 
+            weather data. Each group extends half-way to the neighbouring 
+            angles (wrapping around 360 deg) and includes its upper bound, so 
+            uniform and non-uniform angle sets are handled in a single pass. 
+            Records without wind direction get index -1. """
+        angles = np.mod(np.asarray(angles, dtype=float), 360)
+        order = np.argsort(angles, kind='stable')
+        centres = angles[order]
+        # upper bounds of the groups, the last one wraps around north
+        upper = (centres + np.append(centres[1:], centres[0] + 360)) / 2
+        wind_dir = np.mod(np.asarray(wind_dir, dtype=float), 360)
+        # directions above the last bound belong to the first group
+        wind_dir = np.where(wind_dir > upper[-1], wind_dir - 360, wind_dir)
+        # NaN directions are sorted past the last bound and map to -1
+        idx = np.searchsorted(upper, wind_dir, side='left')
+        return np.append(order, -1).astype(np.int16)[idx]
 
-    def group_seasons(self, df_wind, date_col):
-        """ Assign season to each record in weather data """
-        df_wind[date_col] = pd.to_datetime(df_wind[date_col])
-        df_wind[date_col] = df_wind[date_col].apply(lambda x: x.timetuple().tm_yday)
-        # days of year
-        mask_spring = (df_wind[date_col].between(80, 172, inclusive='left'))
-        mask_summer = (df_wind[date_col].between(172, 264, inclusive='left'))
-        mask_fall = (df_wind[date_col].between(264, 355, inclusive='left'))
-        df_wind['Season'] = 'winter'
-        df_wind.loc[mask_spring, 'Season'] = 'spring'
-        df_wind.loc[mask_summer, 'Season'] = 'summer'
-        df_wind.loc[mask_fall, 'Season'] = 'autumn'
+    def group_seasons(self, df_wind, date_col, seasons=None):
+        """ Assign season, month and hour to each record in weather data. 
+            Seasons map season names to their first day of year (defaults 
+            to self.seasons); days before the earliest start belong to the 
+            season starting last, wrapping around the new year. Seasons are 
+            stored as categorical codes, the timestamps are kept intact. """
+        seasons = self.seasons if seasons is None else seasons
+        starts = np.asarray(list(seasons.values()))
+        order = np.argsort(starts, kind='stable')
+        dates = pd.to_datetime(df_wind[date_col])
+        days = dates.dt.dayofyear.to_numpy()
+        # position of the last season start not later than the day of year,
+        # -1 (days before the first start) picks the season starting last
+        idx = np.searchsorted(starts[order], days, side='right') - 1
+        df_wind[date_col] = dates
+        df_wind['Season'] = pd.Categorical.from_codes(
+            order[idx].astype(np.int8), categories=list(seasons))
+        df_wind['Month'] = dates.dt.month.to_numpy(dtype=np.int8)
+        df_wind['Hour'] = dates.dt.hour.to_numpy(dtype=np.int8)
         return df_wind
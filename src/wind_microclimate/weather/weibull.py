@@ -1,29 +1,48 @@
 import os, sys, glob
+import numpy as np
 import pandas as pd
-from logging import error
-from reliability.Fitters import Fit_Weibull_2P
-from reliability.Other_functions import histogram
+from logging import error, info
 import matplotlib.pyplot as plt
 from pathlib import Path
 
+from wind_microclimate import telemetry
 from wind_microclimate.weather.weather import WeatherData
+from wind_microclimate.weather.weibull_fit import fit_weibull_2p, weibull_pdf
 
 
 class WeibullWeatherData(WeatherData):
 
     def __init__(self, data_file, weibull_vref, angles, output_dir, plot=False,
-                 plot_dir='weibull_fit'):
+                 plot_dir='weibull_fit', seasons=None, cache=None):
         super().__init__(data_file)
+        if seasons is not None:
+            self.seasons = seasons
         self.v_ref = weibull_vref
         self.angles = angles
         self.output_dir = Path(output_dir)
         self.plot = plot
         self.plot_dir = plot_dir
         self.date_col = 'datetime'
+        # artifact cache, Weibull parameters are not fitted again if the
+        # weather data and settings did not change
+        self.cache = cache
 
     def prepare_weibull(self):
         """ Read csv file with weather data to dataframe, convert mph to m/s, 
-            group by seasons and apply write_weibull per each group """
+            group by seasons and wind angles, fit Weibull distribution to all 
+            groups and write the parameters of each season """
+        with telemetry.stage('weibull_fit'):
+            self.fit_weibull()
+
+    def fit_weibull(self):
+        """ Fit the Weibull parameters unless fitted to the same data """
+        if self.cache is not None:
+            key = self.cache.key('weibull', Path(self.data_file),
+                                 list(self.angles), self.v_ref, self.seasons,
+                                 self.plot)
+            if self.cache.fresh('weibull', key):
+                info('Weibull parameters already fitted to the same data')
+                return
         data = pd.read_csv(self.data_file, usecols=[self.date_col, self.ws_col, 
             self.wd_col])
         # remove rows where there is no wind direction data
@@ -35,39 +54,51 @@ class WeibullWeatherData(WeatherData):
         # assign seasons to weather data
         df_seasons = self.group_seasons(data, self.date_col)
         # assign wind angle groups to wind directions in weather data
-        df_angles = self.group_wind_data(df_seasons, self.angles, self.wd_col)
-        gb_season = df_angles.groupby('Season')
-        # seasonal Weibull parameters
-        gb_season.apply(lambda x: self.write_weibull(x, x.name))
-        # annual Weibull parameters
-        self.write_weibull(df_angles, 'annual')
+        sectors = self.group_wind_data(df_seasons[self.wd_col], self.angles)
+        seasons = df_seasons['Season'].cat.codes.to_numpy(dtype=np.intp)
+        n_angles = len(self.angles)
+        n_seasons = len(df_seasons['Season'].cat.categories)
+        wind_speeds = df_seasons[self.ws_col].to_numpy(dtype=float)
+        # season x angle groups followed by annual angle groups, all fitted
+        # in one batch
+        groups = np.concatenate((seasons * n_angles + sectors,
+                                 n_seasons * n_angles + sectors))
+        wind_speeds = np.concatenate((wind_speeds, wind_speeds))
+        valid = np.concatenate((sectors, sectors)) >= 0
+        groups, wind_speeds = groups[valid], wind_speeds[valid]
+        n_groups = (n_seasons + 1) * n_angles
+        scale, shape = fit_weibull_2p(wind_speeds, groups, n_groups=n_groups)
+        counts = np.bincount(groups, minlength=n_groups)
+        names = list(df_seasons['Season'].cat.categories) + ['annual']
+        outputs = []
+        for idx, season in enumerate(names):
+            group_slice = slice(idx * n_angles, (idx + 1) * n_angles)
+            # skip seasons without records
+            if counts[group_slice].sum() > 0:
+                outputs.append(self.write_weibull(
+                    season, counts[group_slice], scale[group_slice],
+                    shape[group_slice]))
+        if self.plot:
+            self.plot_weibull(wind_speeds, groups, scale, shape, names)
+        if self.cache is not None:
+            self.cache.record('weibull', key, outputs)
 
-    def write_weibull(self, gb, season):
-        """ Group the dataframe by wind angle, apply weibull_params per each 
-            group and write parameters to csv file """
+    def write_weibull(self, season, counts, scale, shape):
+        """ Write probability of each wind angle (with any records) and 
+            Weibull scale and shape parameters to csv file, return its path.
+            Angles without fitted parameters (less than two distinct wind 
+            speeds) are left out, i.e. get zero probability. """
         # n of weather data records per season
-        n_records = gb['Direction'].count()
-        gb_angle = gb.groupby('Direction')
-        params = []
-        # calculate Weibull parameters for each angle group
-        gb_angle.apply(lambda x: params.append(self.weibull_params(
-            x[self.ws_col].values.tolist(), n_records, x.name, season)))
-        self.df_weibull = pd.DataFrame(params, columns=['Direction', 'p', 'c', 'k'])
-        self.df_weibull.to_csv(self.output_dir / 'weibull_{0}.csv'.format(season),
-                               index=False)
-
-    def weibull_params(self, wind_speeds, n_records, group, season):
-        """ Fit Weibull distribution to given wind speed data and save the PDF 
-            fnction to a file (plot=True); return wind angle, wind angle 
-            probability and Weibull shape and scale parameters """
-        # probability of wind direction
-        wind_p = len(wind_speeds)/n_records
-        # fit Weibull dist to wind speed data
-        self.wb = Fit_Weibull_2P(failures=wind_speeds, show_probability_plot=False,
-            print_results=False)
-        if self.plot:
-            self.plot_weibull(wind_speeds, season, group)
-        return [group, wind_p, self.wb.alpha, self.wb.beta]
+        n_records = counts.sum()
+        has_records = (counts > 0) & np.isfinite(scale) & np.isfinite(shape)
+        self.df_weibull = pd.DataFrame({
+            'Direction': np.asarray(self.angles)[has_records],
+            'p': counts[has_records] / n_records,
+            'c': scale[has_records],
+            'k': shape[has_records]})
+        csv_weibull = self.output_dir / 'weibull_{0}.csv'.format(season)
+        self.df_weibull.to_csv(csv_weibull, index=False)
+        return csv_weibull
 
     def find_weibull(self, weibull_dir='.'):
         """ Return names of the csv files with Weibull parameters in the given 
@@ -78,12 +109,22 @@ class WeibullWeatherData(WeatherData):
         else:
             return weibull_csv
 
-    def plot_weibull(self, wind_speeds, season, group):
+    def plot_weibull(self, wind_speeds, groups, scale, shape, seasons):
+        """ Save histogram of wind speeds and fitted Weibull PDF of each 
+            season and wind angle group to a file """
         Path(self.plot_dir).mkdir(parents=True, exist_ok=True)
-        histogram(wind_speeds)
-        self.wb.distribution.PDF(label='Fit_Weibull_2P')
-        plt.title(f'Fitting Weibull distribution for {season}, {group} deg')
-        plt.xlabel('wind speed')
-        plt.legend()
-        plt.savefig(os.path.join(self.plot_dir, f'{season}-{group}-deg.png'))
-        plt.close()
+        order = np.argsort(groups, kind='stable')
+        present, starts = np.unique(groups[order], return_index=True)
+        for group, ws in zip(present, np.split(wind_speeds[order], starts[1:])):
+            season = seasons[group // len(self.angles)]
+            angle = self.angles[group % len(self.angles)]
+            plt.hist(ws, bins='auto', density=True, color='lightgrey',
+                     edgecolor='k', linewidth=0.5)
+            x = np.linspace(0, ws.max(), 200)
+            plt.plot(x, weibull_pdf(x, scale[group], shape[group]),
+                     label='Fit_Weibull_2P')
+            plt.title(f'Fitting Weibull distribution for {season}, {angle} deg')
+            plt.xlabel('wind speed')
+            plt.legend()
+            plt.savefig(os.path.join(self.plot_dir, f'{season}-{angle}-deg.png'))
+            plt.close()
@@ -0,0 +1,117 @@
+""" Maximum likelihood fit of the 2-parameter Weibull distribution
+
+    All groups of wind speeds (e.g. season x wind direction) are fitted at
+    once: the values are sorted into contiguous segments, one per group, and
+    the likelihood equation for the shape parameter is solved by a Newton
+    iteration vectorized over all segments. Groups for which the iteration
+    does not converge are refitted one by one with a bracketed root finder,
+    in a process pool when there are several of them.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from logging import warning
+import numpy as np
+from scipy.optimize import brentq
+
+
+def fit_weibull_2p(values, groups, n_groups=None, tol=1e-12, max_iter=50,
+                   processes=None):
+    """ Fit Weibull distribution to values of each group; groups holds the
+        group index (0 to n_groups - 1) of each value. Return arrays of
+        scale (alpha) and shape (beta) parameters of all groups, NaN for
+        groups with less than two distinct values. """
+    values = np.asarray(values, dtype=float)
+    groups = np.asarray(groups, dtype=np.intp)
+    if n_groups is None:
+        n_groups = int(groups.max()) + 1 if groups.size else 0
+    scale = np.full(n_groups, np.nan)
+    shape = np.full(n_groups, np.nan)
+    # contiguous segment of log values for each non-empty group
+    order = np.argsort(groups, kind='stable')
+    log_x, groups = np.log(values[order]), groups[order]
+    present, starts, counts = np.unique(groups, return_index=True,
+                                        return_counts=True)
+    if present.size == 0:
+        return scale, shape
+    # log values centred on the group mean and shifted by the group maximum,
+    # the shape equation does not depend on the scale of the data
+    mean_log = np.add.reduceat(log_x, starts) / counts
+    z = log_x - np.repeat(mean_log, counts)
+    z_max = np.maximum.reduceat(z, starts)
+    z_shift = z - np.repeat(z_max, counts)
+    std = np.sqrt(np.add.reduceat(z ** 2, starts) / counts)
+    valid = (counts > 1) & (std > 0)
+    # initial guess from the moments of the Gumbel (log-Weibull) distribution
+    k = np.where(valid, 1.2825 / np.where(valid, std, 1), 1.0)
+    converged = ~valid
+    for _ in range(max_iter):
+        s0, s1, s2 = _segment_sums(z, z_shift, k, starts, counts)
+        mean_z = s1 / s0
+        # f(k) = 1/k - E[z] decreases monotonically with k
+        f = 1 / k - mean_z
+        df = -1 / k ** 2 - (s2 / s0 - mean_z ** 2)
+        step = np.where(converged, 0, f / df)
+        # keep the shape parameter positive
+        k_new = np.where(k - step > 0, k - step, k / 2)
+        converged |= np.abs(k_new - k) <= tol * k
+        k = k_new
+        if converged.all():
+            break
+    s0 = _segment_sums(z, z_shift, k, starts, counts)[0]
+    log_scale = mean_log + z_max + np.log(s0 / counts) / k
+    failed = valid & ~(converged & np.isfinite(k) & np.isfinite(log_scale))
+    scale[present], shape[present] = np.exp(log_scale), k
+    scale[present[~valid]] = shape[present[~valid]] = np.nan
+    if failed.any():
+        segments = [log_x[start:start + n] for start, n
+                    in zip(starts[failed], counts[failed])]
+        params = _fit_segments(segments, processes)
+        scale[present[failed]], shape[present[failed]] = zip(*params)
+    if (~valid).any():
+        warning(f'Weibull distribution not fitted for {(~valid).sum()} '
+                'groups with less than two distinct values')
+    return scale, shape
+
+
+def weibull_pdf(x, scale, shape):
+    """ Probability density function of the 2-parameter Weibull
+        distribution """
+    x = np.asarray(x, dtype=float)
+    return shape / scale * (x / scale) ** (shape - 1) * \
+        np.exp(-(x / scale) ** shape)
+
+
+def _segment_sums(z, z_shift, k, starts, counts):
+    """ Sums of exp(k z) z^n (n = 0, 1, 2) within each group, scaled by
+        exp(-k max(z)) to avoid overflow """
+    w = np.exp(np.repeat(k, counts) * z_shift)
+    wz = w * z
+    return (np.add.reduceat(w, starts), np.add.reduceat(wz, starts),
+            np.add.reduceat(wz * z, starts))
+
+
+def _fit_segments(segments, processes=None):
+    """ Fit groups one by one, in a process pool if there are several """
+    if len(segments) == 1:
+        return [_fit_segment(segments[0])]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_fit_segment, segments))
+
+
+def _fit_segment(log_x):
+    """ Fit a single group of log values by bracketed root finding of the
+        likelihood equation for the shape parameter """
+    z = log_x - log_x.mean()
+    z_max = z.max()
+
+    def shape_eq(k):
+        w = np.exp(k * (z - z_max))
+        return 1 / k - (w * z).sum() / w.sum()
+
+    hi = 1.0
+    while shape_eq(hi) > 0:
+        hi *= 2
+    k = brentq(shape_eq, hi / 2 if hi > 1 else 1e-6, hi, xtol=1e-14)
+    log_scale = log_x.mean() + z_max + \
+        np.log(np.exp(k * (z - z_max)).mean()) / k
+    return float(np.exp(log_scale)), k
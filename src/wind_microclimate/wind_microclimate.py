@@ -2,13 +2,16 @@ import os, sys, logging
 import numpy as np
 from pathlib import Path
 
+from wind_microclimate import telemetry, profiling
 from wind_microclimate.input.user_input import UserInput
+from wind_microclimate.cache import ArtifactCache
 from wind_microclimate.weather.epw import EpwWeatherData
 from wind_microclimate.weather.weibull import WeibullWeatherData
 from wind_microclimate.pre_proc.wind_csv import WindCSV
 from wind_microclimate.pre_proc.wind_logarithmic import WindLogarithmic
-from wind_microclimate.solver.solver import Solver
-from wind_microclimate.post_proc.helpers import postproc_background
+from wind_microclimate.solver.solver import Solver, decompose_template
+from wind_microclimate.solver.scheduler import Scheduler
+from wind_microclimate.post_proc.helpers import PostProcPool, postproc_background
 from wind_microclimate.post_proc.vr import VR
 from wind_microclimate.post_proc.lawson_epw import LawsonEpw
 from wind_microclimate.post_proc.lawson_weibull import LawsonWeibull
@@ -35,9 +38,15 @@ def main():
                         format='%(asctime)s: %(levelname)s: %(message)s',
                         datefmt="%Y-%m-%d %H:%M:%S")
 
+    # resources used by each stage of each wind direction
+    telemetry.configure(output_dir / 'telemetry.jsonl')
+
     # specific input paths
     input_xlsx = input_dir / 'INPUT.xlsx'
     inputs = UserInput(input_xlsx)
+    # chosen stages wrapped with the profiler (none by default)
+    profiling.install(profiling.chosen_stages(inputs.profile),
+                      output_dir / 'profiles')
     input_case = input_dir / inputs.case
     hist_weather_data = input_dir / 'Heathrow 1997-01-01 to 2016-12-31.csv'
     
@@ -64,6 +73,34 @@ def main():
         # write paraview inputs to the file
         inputs.write_pv_input(pv_input)
 
+    # cache of pipeline artifacts (converted mesh, Weibull tables, VR and 
+    # Lawson results), stages are done again only if their inputs changed
+    cache = ArtifactCache(output_dir / 'cache.json')
+    # CFD results (and so VR results) depend on the template case (mesh, 
+    # boundary conditions incl. wind profile, solver settings) and iterations
+    cfd_inputs = [input_case / d for d in ('0', 'constant', 'system')] + \
+        [inputs.it]
+    if inputs.warm_start:
+        cfd_inputs += [inputs.warm_start_iter]
+    if inputs.residual_tolerances:
+        cfd_inputs += [inputs.residual_tolerances]
+    if inputs.wind_profile == 'csv':
+        # csv wind profile is applied to each case, not to the template
+        cfd_inputs += [input_dir / inputs.csv_profile, inputs.weibull_vref]
+
+    # bounded pool of workers for background jobs (mesh check, 
+    # post-processing of calculated cases)
+    pool = PostProcPool(workers=inputs.postproc_workers,
+                        timeout=inputs.postproc_timeout)
+    # create VR post-processing object
+    vr = VR(output_solver, inputs.case, angles, csv_vr, output_vr,
+            engine=inputs.vr_engine,
+            surfaces=getattr(inputs, 'vr_surfaces', None),
+            h_ref=getattr(inputs, 'h_ref', None),
+            receptors_csv=input_dir / inputs.receptors_csv
+            if inputs.vr_receptors else None,
+            export_csv=inputs.vr_csv, cache=cache, cache_inputs=cfd_inputs)
+
     #################### PRE-PROCESSING & CALCULATION #########################
 
     if inputs.run_cfd:
@@ -80,67 +117,113 @@ def main():
 
         # convert Fluent msh file to OpenFoam mesh
         if inputs.convert_msh:
-            case_template.prepare_mesh(input_dir)
+            with telemetry.stage('mesh_conversion', children=True):
+                case_template.prepare_mesh(input_dir, pool=pool, cache=cache)
 
         case_template.setup_template(output_dir)
-
-        for angle in angles:
-            # clone template case to create case for current wind angle
-            case = case_template.clone(output_solver, angle)
-            case.setup_case()
-
-            # create solver object for CFD calculation
-            sol = Solver(case, inputs.proc, inputs.it, save_residuals=True)
-            sol.calculate_cfd()
-
-            # initiate post-processing activities in the background
-            p = postproc_background(sol.case, sol.iterations, csv_vr, output_vr,
-                pv_input, logfile, vr_pictures=inputs.vr_pictures, 
-                vr_receptors=inputs.vr_receptors)
+        # remove VR results calculated from other inputs of the template case
+        vr.invalidate_stale(inputs.vr_calculate, inputs.vr_receptors)
+
+        # mesh decomposed once, the cases only decompose their fields
+        template = None
+        if inputs.decompose_once:
+            with telemetry.stage('decompose_template', children=True):
+                decompose_template(case_template, inputs.proc)
+            template = case_template
+
+        # calculated cases (case path -> wind angle) to warm start from
+        calculated = {} if inputs.warm_start else None
+
+        def solvers():
+            for angle in angles:
+                # clone template case to create case for current wind angle
+                with telemetry.stage('clone') as record:
+                    case = case_template.clone(output_solver, angle,
+                        share_mesh=inputs.share_mesh or inputs.decompose_once,
+                        cache=cache, cache_inputs=cfd_inputs)
+                    case.setup_case()
+                    record['direction'] = os.path.basename(case.case_path)
+
+                # create solver object for CFD calculation
+                yield Solver(case, inputs.proc, inputs.it, save_residuals=True,
+                             template=template, warm_start=calculated,
+                             warm_start_iter=inputs.warm_start_iter,
+                             tolerances=inputs.residual_tolerances,
+                             divergence_factor=inputs.divergence_factor,
+                             concurrent=inputs.total_proc > inputs.proc)
+
+        def postproc(sol):
+            if calculated is not None:
+                calculated[sol.case.case_path] = sol.case.angle
+            # queue post-processing activities in the background:
+            # reconstruct -> VTK -> VR -> merge VR results
+            def merge_vr():
+                vr.merge_case(sol.case.case_path, inputs.vr_calculate,
+                              inputs.vr_receptors)
+
+            def calculate_vr():
+                vr.calculate_missing(sol.case.case_path, sol.case.v_ref,
+                                     inputs.vr_calculate, inputs.vr_receptors)
+
+            numpy_vr = inputs.vr_engine == 'numpy' and \
+                (inputs.vr_calculate or inputs.vr_receptors)
+            postproc_background(pool, sol.case, sol.iterations, csv_vr,
+                output_vr, pv_input, logfile, vr_pictures=inputs.vr_pictures,
+                vr_receptors=inputs.vr_receptors, merge=merge_vr,
+                calculate_vr=calculate_vr if numpy_vr else None)
+
+        # calculate wind direction cases, several at once if the total number 
+        # of processors allows
+        scheduler = Scheduler(inputs.total_proc, on_finish=postproc)
+        scheduler.run(solvers())
 
     ########################### POST-PROCESSING ###############################
 
-    if post_process:
-        # wait for the postproc_background to finish
-        if inputs.run_cfd:
-            logging.info(f'Waiting until post-processing of {case.case_path}' +
-                         ' finishes')
-            p.join()
-
-        # create VR post-processing object
-        vr = VR(output_solver, inputs.case, angles, csv_vr, output_vr)
+    # wait until all background jobs of every wind direction finish
+    pool.shutdown()
 
+    if post_process:
         # create weather data and Lawson post-processing objects
         if inputs.method == 'weibull':
             wtr = WeibullWeatherData(hist_weather_data, inputs.weibull_vref,
                                      angles, input_dir, plot=True,
-                                     plot_dir=output_weather)
+                                     plot_dir=output_weather, cache=cache)
             lawson = LawsonWeibull(output_solver, inputs.case, angles, wtr,
                                    inputs.prep_weibull_params, csv_vr,
-                                   csv_lawson, inputs.lawson_receptors)
+                                   csv_lawson, inputs.lawson_receptors,
+                                   chunk_size=inputs.lawson_chunk_size,
+                                   cache=cache)
         if inputs.method == 'epw':
             if 'wtr' not in locals():
                 wtr = EpwWeatherData(input_dir)
             lawson = LawsonEpw(output_solver, inputs.case, angles, wtr, csv_vr,
-                               csv_lawson, inputs.lawson_receptors)
+                               csv_lawson, inputs.lawson_receptors,
+                               chunk_size=inputs.lawson_chunk_size,
+                               cache=cache)
 
         # velocity ratio results
         if inputs.vr_calculate or inputs.vr_pictures or inputs.vr_receptors:
-            vr.generate_results(inputs.vr_calculate, inputs.vr_receptors,
-                                wtr.v_ref, pv_input, logfile=logfile)
+            with telemetry.stage('vr', children=True):
+                vr.generate_results(inputs.vr_calculate, inputs.vr_receptors,
+                                    wtr.v_ref, pv_input, logfile=logfile)
 
         # calculate wind microclimate results
         if inputs.lawson_calculate:
-            lawson.calculate()
+            with telemetry.stage('lawson'):
+                lawson.calculate()
 
         # calculate wind microclimate results in receptor locations
         if inputs.lawson_receptors:
-            lawson.calculate(receptors=True)
+            with telemetry.stage('lawson', 'receptors'):
+                lawson.calculate(receptors=True)
 
         # generate colour maps with wind microclimate results
         if inputs.lawson_pictures:
             lawson.colour_map(pv_input, logfile=logfile)
 
+    # where the time of the run went, per stage
+    telemetry.summary(output_dir / 'telemetry_summary.csv')
+
 
 if __name__ == '__main__':
     print('test')
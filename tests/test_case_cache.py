@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+import pytest
+from PyFoam.RunDictionary.SolutionDirectory import SolutionDirectory
+from wind_microclimate.cache import ArtifactCache
+from wind_microclimate.pre_proc.case import Case
+
+
+class Template(Case):
+    """ Case cloned as is (no OpenFOAM installation needed) """
+
+    def __init__(self, case_path):
+        self.case_path = case_path
+        self.foam_obj = SolutionDirectory(case_path, archive=None)
+
+    def return_clone(self, clone_path, angle):
+        return clone_path
+
+    def set_wind(self):
+        pass
+
+    def setup_template(self):
+        pass
+
+
+def write_case(path):
+    for name, text in (('0/k', 'k 1'), ('constant/polyMesh/points', 'mesh 1'),
+                       ('system/controlDict', 'FoamFile {}'),
+                       ('system/fvSchemes', ''), ('system/fvSolution', '')):
+        (path / name).parent.mkdir(parents=True, exist_ok=True)
+        (path / name).write_text(text)
+
+
+@pytest.mark.parametrize("share_mesh", [False, True])
+def test_clone_redone_when_inputs_change(tmp_path, share_mesh):
+    template_path = tmp_path / 'site'
+    write_case(template_path)
+    cache = ArtifactCache(tmp_path / 'cache.json')
+    inputs = [template_path / d for d in ('0', 'constant', 'system')]
+
+    def clone(iterations=100):
+        return Path(Template(str(template_path)).clone(
+            tmp_path / 'solver', 90.0, share_mesh=share_mesh, cache=cache,
+            cache_inputs=inputs + [iterations]))
+
+    results = clone() / '100' / 'U'
+    results.parent.mkdir()
+    results.write_text('calculated')
+    # unchanged inputs keep the calculated case
+    assert clone() == tmp_path / 'solver' / 'site_90.0'
+    assert results.exists()
+    # new boundary conditions
+    (template_path / '0' / 'k').write_text('k 2')
+    assert (clone() / '0' / 'k').read_text() == 'k 2'
+    assert not results.exists()
+    # new mesh: the clone links or copies it, not the old one
+    results.parent.mkdir()
+    mesh = template_path / 'constant' / 'polyMesh' / 'points'
+    if share_mesh:
+        # shared files are read-only, the new mesh is written to new ones
+        os.remove(mesh)
+    mesh.write_text('mesh 2')
+    assert (clone() / 'constant' / 'polyMesh' / 'points').read_text() == \
+        'mesh 2'
+    assert not results.parent.exists()
+    # other settings
+    results.parent.mkdir()
+    clone(iterations=200)
+    assert not results.parent.exists()
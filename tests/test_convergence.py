@@ -0,0 +1,167 @@
+import math, threading
+import pytest
+from wind_microclimate.solver.convergence import ResidualMonitor, follow, \
+    parse_tolerances, RUNNING, CONVERGED, DIVERGED
+
+FIELDS = ['Ux', 'Uy', 'Uz', 'p', 'epsilon', 'k']
+
+
+def simple_foam_log(residuals, end=True):
+    """ Lines of a simpleFoam log; residuals(time, field) gives the initial
+        residual of each field in each time step (None: not solved) """
+    lines = ['/*---------------------------------------------------------*\\',
+             'Create time', '', 'SIMPLE: convergence criteria', '',
+             'Starting time loop', '']
+    for t in range(1, 1000):
+        values = {field: residuals(t, field) for field in FIELDS}
+        if all(value is None for value in values.values()):
+            break
+        lines.append(f'Time = {t}')
+        lines.append('')
+        for field, value in values.items():
+            if value is None:
+                continue
+            solver = 'GAMG' if field == 'p' else 'smoothSolver'
+            lines.append(f'{solver}:  Solving for {field}, Initial residual '
+                         f'= {value:g}, Final residual = {value * 1e-3:g}, '
+                         'No Iterations 3')
+        lines.append('time step continuity errors : sum local = 1e-05')
+        lines.append(f'ExecutionTime = {t * 0.1:.1f} s  ClockTime = {t} s')
+        lines.append('')
+    if end:
+        lines.append('End')
+    return lines
+
+
+def decaying(steps, rate=0.1):
+    return lambda t, field: math.exp(-rate * t) if t <= steps else None
+
+
+def run(monitor, lines):
+    for line in lines:
+        if monitor.feed(line) != RUNNING:
+            break
+    return monitor
+
+
+def test_parse_tolerances():
+    assert parse_tolerances('p: 1e-4, U: 1e-5') == {'p': 1e-4, 'U': 1e-5}
+    assert parse_tolerances('') == {}
+
+
+def test_converged():
+    monitor = run(ResidualMonitor({'p': 1e-3, 'U': 1e-3}),
+                  simple_foam_log(decaying(200)))
+    assert monitor.status == CONVERGED
+    # exp(-0.1 t) <= 1e-3 from t = 70
+    assert monitor.time == '70'
+
+
+def test_vector_field_converges_on_all_components():
+    def residuals(t, field):
+        if t > 200:
+            return None
+        # Uz lags behind the other components
+        return math.exp(-0.1 * t) * (10 if field == 'Uz' else 1)
+
+    monitor = run(ResidualMonitor({'U': 1e-3}), simple_foam_log(residuals))
+    assert monitor.status == CONVERGED
+    assert monitor.time == '93'
+
+
+def test_running_until_tolerances_reached():
+    monitor = run(ResidualMonitor({'p': 1e-6}),
+                  simple_foam_log(decaying(50), end=False))
+    assert monitor.status == RUNNING
+    assert monitor.time == '49'
+
+
+def test_end_line_closes_last_time_step():
+    # tolerances reached at the last time step, seen only at the End line
+    lines = simple_foam_log(decaying(70))
+    monitor = run(ResidualMonitor({'p': 1e-3}), lines[:-1])
+    assert monitor.status == RUNNING
+    assert monitor.feed(lines[-1]) == CONVERGED
+    assert monitor.time == '70'
+
+
+@pytest.mark.parametrize("value", ['nan', '-nan', 'inf'])
+def test_diverged_not_finite(value):
+    lines = simple_foam_log(decaying(100))
+    lines.insert(lines.index('Time = 30') + 3,
+                 f'GAMG:  Solving for p, Initial residual = {value}, Final '
+                 'residual = nan, No Iterations 1000')
+    monitor = run(ResidualMonitor(divergence_factor=1e3), lines)
+    assert monitor.status == DIVERGED
+    assert 'p residual is' in monitor.reason
+
+
+def test_diverged_growth():
+    def residuals(t, field):
+        if t > 200:
+            return None
+        return math.exp(-0.05 * t) if t <= 40 else \
+            math.exp(-0.05 * 40 + 0.2 * (t - 40))
+
+    monitor = run(ResidualMonitor({'p': 1e-6}, divergence_factor=100),
+                  simple_foam_log(residuals))
+    assert monitor.status == DIVERGED
+    # grown 100 times above the minimum exp(-2) after 24 time steps
+    assert monitor.time == '64'
+
+
+def test_zero_residual_does_not_diverge():
+    def residuals(t, field):
+        if t > 100:
+            return None
+        # Uz solved to zero at first, then small positive values
+        if field == 'Uz':
+            return 0. if t < 10 else 1e-4 * math.exp(-0.05 * t)
+        return math.exp(-0.1 * t)
+
+    monitor = run(ResidualMonitor({'p': 1e-20}, divergence_factor=10),
+                  simple_foam_log(residuals))
+    assert monitor.status == RUNNING
+
+
+def test_first_residual_of_each_time_step():
+    # later solutions of a field within the time step are ignored
+    lines = simple_foam_log(decaying(3))
+    lines.insert(lines.index('Time = 2') + 3,
+                 'GAMG:  Solving for p, Initial residual = 1e+10, Final '
+                 'residual = 1, No Iterations 3')
+    lines.insert(lines.index('Time = 2') + 2,
+                 'GAMG:  Solving for p, Initial residual = 0.5, Final '
+                 'residual = 1e-4, No Iterations 3')
+    monitor = run(ResidualMonitor(divergence_factor=10), lines)
+    assert monitor.status == RUNNING
+
+
+def test_follow_reads_growing_file(tmp_path):
+    log = tmp_path / 'log'
+    lines = simple_foam_log(decaying(20))
+    done = threading.Event()
+
+    def write():
+        with open(log, 'w') as f:
+            for line in lines:
+                # lines written in parts, as the solver flushes its output
+                f.write(line[:5])
+                f.flush()
+                f.write(line[5:] + '\n')
+                f.flush()
+        done.set()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    read = list(follow(str(log), done, poll=0.01))
+    writer.join()
+    assert read == lines
+    monitor = run(ResidualMonitor({'p': 1e-3}), read)
+    assert monitor.status == RUNNING and monitor.time == '20'
+
+
+def test_follow_missing_file(tmp_path):
+    done = threading.Event()
+    done.set()
+    assert list(follow(str(tmp_path / 'log'), done, poll=0.01)) == []
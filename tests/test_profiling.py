@@ -0,0 +1,38 @@
+import os
+from wind_microclimate import profiling
+
+
+class Stages:
+
+    def method(self, x):
+        return x + 1
+
+    @staticmethod
+    def static(x):
+        return x + 2
+
+    @classmethod
+    def klass(cls, x):
+        return (cls.__name__, x + 3)
+
+
+def function(x):
+    return x + 4
+
+
+def test_install_keeps_method_kinds(tmp_path):
+    module = __name__
+    stages = [f'{module}:Stages.method', f'{module}:Stages.static',
+              f'{module}:Stages.klass', f'{module}:function']
+    assert profiling.install(stages, tmp_path) == stages
+    assert Stages().method(1) == 2
+    assert Stages.static(1) == 3 and Stages().static(1) == 3
+    assert Stages.klass(1) == ('Stages', 4)
+    assert function(1) == 5
+    for stage in stages:
+        assert os.path.exists(tmp_path / f'{stage}.1.prof')
+        assert os.path.exists(tmp_path / f'{stage}.1.folded')
+
+
+def test_unknown_stage(tmp_path):
+    assert profiling.install([f'{__name__}:Stages.missing'], tmp_path) == []
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+from wind_microclimate.cache import ArtifactCache
+from wind_microclimate.post_proc.vr import VR
+from wind_microclimate.post_proc.vr_store import VRStore, POINT_COLS
+
+
+def vr_table(n_points, seed=0, points_seed=0):
+    rng = np.random.default_rng(points_seed)
+    df = pd.DataFrame(rng.uniform(0, 500, (n_points, 3)), columns=POINT_COLS)
+    df['Name'] = [f'surface{i % 3}' for i in range(n_points)]
+    df['VR'] = np.random.default_rng(seed).gamma(4, 0.15, n_points)
+    return df
+
+
+def test_concurrent_writes(tmp_path):
+    store = VRStore(tmp_path / 'VR_store')
+    cases = [f'case_{angle}' for angle in range(0, 360, 10)]
+    tables = {case: vr_table(20000, seed=i) for i, case in enumerate(cases)}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda case: store.write(case, tables[case]),
+                          cases))
+    for case in cases:
+        df = store.read(case)
+        np.testing.assert_allclose(df['VR'], tables[case]['VR'], rtol=1e-6)
+        np.testing.assert_allclose(df[POINT_COLS], tables[case][POINT_COLS])
+        assert (df['Name'] == tables[case]['Name']).all()
+    assert not list((tmp_path / 'VR_store').glob('*.tmp*'))
+
+
+def test_other_points_rejected(tmp_path):
+    store = VRStore(tmp_path / 'VR_store')
+    store.write('case_0', vr_table(100))
+    with pytest.raises(ValueError):
+        store.write('case_10', vr_table(100, points_seed=1))
+    store.clear()
+    store.write('case_10', vr_table(100, points_seed=1))
+    assert not store.exists('case_0') and store.exists('case_10')
+
+
+def test_store_cleared_when_inputs_change(tmp_path):
+    template = tmp_path / 'site' / 'constant'
+    template.mkdir(parents=True)
+    (template / 'mesh').write_text('mesh 1')
+    cache = ArtifactCache(tmp_path / 'cache.json')
+
+    def vr():
+        return VR(tmp_path, 'site', [0.0, 90.0], tmp_path / 'VR.csv',
+                  tmp_path, cache=cache, cache_inputs=[template])
+
+    first = vr()
+    first.invalidate_stale(True, False)
+    for angle in first.angles:
+        first.store.write(f'{first.case}_{angle}', vr_table(100))
+        first.record(f'{first.case}_{angle}')
+    # unchanged inputs keep the results
+    vr().invalidate_stale(True, False)
+    assert all(first.store.exists(f'{first.case}_{a}') for a in first.angles)
+    # new mesh, new points
+    (template / 'mesh').write_text('mesh 2')
+    second = vr()
+    second.invalidate_stale(True, False)
+    assert not any(second.store.exists(f'{second.case}_{a}')
+                   for a in second.angles)
+    second.store.write(f'{second.case}_0.0', vr_table(50, points_seed=2))
+    assert len(second.store.read_points()) == 50
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from wind_microclimate.post_proc import vtk
+from wind_microclimate.post_proc.vtk import LegacyVTK
+
+
+def write_vtk(path, points, u, p, binary=False):
+    """ Legacy POLYDATA file of points (one vertex each) with point data
+        arrays U and p in a FIELD """
+    n = len(points)
+
+    def array(values, dtype):
+        if binary:
+            return np.asarray(values).astype('>' + dtype).tobytes() + b'\n'
+        # several values per line, as written by foamToVTK
+        flat = np.asarray(values).ravel()
+        return b''.join(' '.join(f'{v:g}' for v in flat[i:i + 9]).encode()
+                        + b'\n' for i in range(0, len(flat), 9))
+
+    header = (f'# vtk DataFile Version 2.0\nsynthetic\n'
+              f'{"BINARY" if binary else "ASCII"}\nDATASET POLYDATA\n'
+              f'POINTS {n} float\n').encode()
+    cells = np.column_stack((np.ones(n, dtype=int), np.arange(n)))
+    with open(path, 'wb') as f:
+        f.write(header + array(points, 'f4'))
+        f.write(f'VERTICES {n} {2 * n}\n'.encode() + array(cells, 'i4'))
+        f.write(f'POINT_DATA {n}\nFIELD attributes 2\n'
+                f'U 3 {n} float\n'.encode() + array(u, 'f4'))
+        f.write(f'p 1 {n} float\n'.encode() + array(p, 'f4'))
+
+
+@pytest.fixture
+def fields():
+    rng = np.random.default_rng(0)
+    n = 1000
+    return (rng.uniform(0, 500, (n, 3)).round(2),
+            rng.normal(0, 3, (n, 3)).round(4), rng.normal(0, 1, n).round(4))
+
+
+@pytest.mark.parametrize("binary", [False, True])
+@pytest.mark.parametrize("chunk", [16, 1000, 1 << 20])
+def test_read_arrays(tmp_path, monkeypatch, fields, binary, chunk):
+    monkeypatch.setattr(vtk, 'ASCII_CHUNK', chunk)
+    points, u, p = fields
+    path = tmp_path / 'case_100.vtk'
+    write_vtk(path, points, u, p, binary)
+    data = LegacyVTK(str(path))
+    assert data.dataset == 'POLYDATA'
+    np.testing.assert_allclose(data.points, points, rtol=1e-6)
+    np.testing.assert_allclose(data.point_data['U'], u, rtol=1e-6)
+    np.testing.assert_allclose(data.point_data['p'], p, rtol=1e-6)
+
+
+def test_truncated_file(tmp_path, fields):
+    points, u, p = fields
+    path = tmp_path / 'case_100.vtk'
+    write_vtk(path, points, u, p)
+    text = path.read_bytes()
+    path.write_bytes(text[:len(text) // 2])
+    with pytest.raises(ValueError):
+        LegacyVTK(str(path))
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+from wind_microclimate.pre_proc.case import Case
+from wind_microclimate.pre_proc.warm_start import split_internal_field, \
+    parse_internal_field, format_internal_field, read_internal_field, \
+    write_internal_field, rotate_vectors, angle_difference, initialise_fields
+
+HEADER = """FoamFile
+{
+    version     2.0;
+    format      ascii;
+    class       %s;
+    object      %s;
+}
+
+dimensions      [0 1 -1 0 0 0 0];
+
+"""
+BOUNDARY = """
+boundaryField
+{
+    side-n
+    {
+        type            fixedValue;
+        value           $internalField;
+    }
+    ground
+    {
+        type            zeroGradient;
+    }
+}
+"""
+
+
+class WindVector(Case):
+    """ Case reduced to the wind vector of setup_case (no case files) """
+
+    def __init__(self, angle):
+        self.angle = angle
+
+    def choose_outlet(self):
+        return []
+
+    def return_clone(clone_path, angle):
+        pass
+
+    def set_wind(self):
+        pass
+
+    def setup_template(self):
+        pass
+
+
+def wind_vector(angle):
+    case = WindVector(angle)
+    case.setup_case()
+    return np.array(case.wind_vector + [0.])
+
+
+def write_field(path, cls, internal):
+    path.write_text(HEADER % (cls, path.name) +
+                    f'internalField   {internal};\n' + BOUNDARY)
+
+
+@pytest.mark.parametrize("values", [
+    np.array([1.5, -2.25, 3e-5, 0.]),
+    np.array([[1., 2., 3.], [-0.5, 0., 1e-3]]),
+])
+def test_nonuniform_round_trip(values):
+    parsed = parse_internal_field(format_internal_field(values).strip())
+    assert parsed.shape == values.shape
+    np.testing.assert_allclose(parsed, values)
+
+
+@pytest.mark.parametrize("value,expected", [
+    ('uniform 0.1', 0.1),
+    ('uniform (1 -2 0.5)', np.array([1., -2., 0.5])),
+])
+def test_uniform_values(value, expected):
+    np.testing.assert_allclose(parse_internal_field(value), expected)
+
+
+def test_split_keeps_surrounding_text(tmp_path):
+    path = tmp_path / 'k'
+    write_field(path, 'volScalarField', 'uniform 0.1')
+    text = path.read_text()
+    before, value, after = split_internal_field(text)
+    assert value == 'uniform 0.1'
+    assert before + 'internalField   uniform 0.1;' + after == text
+
+
+@pytest.mark.parametrize("source,target", [
+    (0., 90.), (90., 0.), (30., 200.), (350., 10.), (225., 45.),
+])
+def test_rotation_maps_wind_vectors(source, target):
+    rotated = rotate_vectors(wind_vector(source),
+                             angle_difference(target, source))
+    np.testing.assert_allclose(rotated, wind_vector(target), atol=1e-12)
+
+
+def test_rotation_keeps_vertical_component():
+    vectors = np.array([[1., 2., 3.], [-4., 0.5, -6.]])
+    rotated = rotate_vectors(vectors, 73.)
+    np.testing.assert_allclose(rotated[:, 2], vectors[:, 2])
+    np.testing.assert_allclose(np.linalg.norm(rotated, axis=1),
+                               np.linalg.norm(vectors, axis=1))
+
+
+def test_write_keeps_boundary_field(tmp_path):
+    path = tmp_path / 'U'
+    write_field(path, 'volVectorField', 'uniform (0 0 0)')
+    original = split_internal_field(path.read_text())
+    values = np.array([[1., 0., 0.], [0., 2., 0.5], [3., -1., 0.]])
+    write_internal_field(path, values)
+    before, value, after = split_internal_field(path.read_text())
+    np.testing.assert_allclose(parse_internal_field(value), values)
+    assert before == original[0]
+    assert '$internalField' not in after
+    assert after == original[2].replace('$internalField', 'uniform (0 0 0)')
+
+
+def test_initialise_fields(tmp_path):
+    source, target = tmp_path / 'source', tmp_path / 'target'
+    source.mkdir()
+    target.mkdir()
+    u = np.array([[0., -1., 0.], [0., -2., 0.1]])
+    k = np.array([0.1, 0.2])
+    write_field(source / 'U', 'volVectorField', format_internal_field(u))
+    write_field(source / 'k', 'volScalarField', format_internal_field(k))
+    # uniform source fields are not copied
+    write_field(source / 'p', 'volScalarField', 'uniform 0')
+    for field, cls in [('U', 'volVectorField'), ('k', 'volScalarField'),
+                       ('p', 'volScalarField')]:
+        write_field(target / field, cls, 'uniform 0')
+    assert initialise_fields(source, target, 90.) == ['U', 'k']
+    np.testing.assert_allclose(read_internal_field(target / 'U'),
+                               rotate_vectors(u, 90.))
+    np.testing.assert_allclose(read_internal_field(target / 'k'), k)
+    assert read_internal_field(target / 'p') == 0
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from reliability.Fitters import Fit_Weibull_2P
+from wind_microclimate.weather.weibull_fit import fit_weibull_2p
+
+
+def reference_fit(values):
+    fit = Fit_Weibull_2P(failures=values, show_probability_plot=False,
+                         print_results=False)
+    return fit.alpha, fit.beta
+
+
+@pytest.mark.parametrize("seed,scale,shape,n", [
+    (0, 5.0, 2.0, 500),
+    (1, 3.0, 1.4, 50),
+    (2, 8.0, 3.5, 2000),
+])
+def test_single_group(seed, scale, shape, n):
+    values = scale * np.random.default_rng(seed).weibull(shape, n)
+    alpha, beta = fit_weibull_2p(values, np.zeros(n, dtype=int))
+    expected = reference_fit(values)
+    assert alpha[0] == pytest.approx(expected[0], rel=1e-6)
+    assert beta[0] == pytest.approx(expected[1], rel=1e-6)
+
+
+def test_groups_fitted_in_one_batch():
+    rng = np.random.default_rng(3)
+    params = [(4.0, 1.8, 300), (6.5, 2.4, 40), (2.5, 1.2, 1000)]
+    values = np.concatenate([scale * rng.weibull(shape, n)
+                             for scale, shape, n in params])
+    groups = np.repeat(np.arange(len(params)), [n for _, _, n in params])
+    # groups need not be contiguous
+    order = rng.permutation(len(values))
+    alpha, beta = fit_weibull_2p(values[order], groups[order])
+    for i in range(len(params)):
+        expected = reference_fit(values[groups == i])
+        assert alpha[i] == pytest.approx(expected[0], rel=1e-6)
+        assert beta[i] == pytest.approx(expected[1], rel=1e-6)
+
+
+def test_groups_without_fit():
+    # empty group 1, group 2 with a single distinct value
+    values = np.array([3.0, 4.5, 5.0, 2.2, 6.1, 2.0, 2.0])
+    groups = np.array([0, 0, 0, 0, 0, 2, 2])
+    alpha, beta = fit_weibull_2p(values, groups, n_groups=3)
+    assert np.isfinite(alpha[0]) and np.isfinite(beta[0])
+    assert np.isnan(alpha[1:]).all() and np.isnan(beta[1:]).all()